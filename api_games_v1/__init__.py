@@ -0,0 +1 @@
+default_app_config = 'api_games_v1.apps.ApiGamesV1Config'
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ApiGamesV1Config(AppConfig):
     name = 'api_games_v1'
+
+    def ready(self):
+        from . import receivers  # noqa: F401
@@ -0,0 +1,50 @@
+"""
+Authentication classes for the API.
+"""
+import copy
+
+from rest_framework.authentication import TokenAuthentication
+
+from .caching import load_backend
+
+# token key -> Token (with its User), see CachedTokenAuthentication
+token_cache = load_backend('GAMEON_TOKEN_CACHE')
+
+
+def token_cache_key(key):
+    return 'gameon:token:{}'.format(key)
+
+
+def invalidate_token(key):
+    token_cache.delete(token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that caches each token's Token and User, so that
+    repeat requests with the same token do not query the database at all.
+
+    Only successful lookups are cached. Entries are dropped whenever the
+    Token or its User is saved or deleted (see receivers.py), which covers
+    logging out, token rotation and deactivating or editing the User.
+
+    Note that this only drops the entry from the cache backend that the
+    process handling the change can see: with the default (per-process)
+    LocMemBackend, the other processes keep accepting a revoked token
+    until their entry expires, so its ttl is kept to a few seconds (see
+    settings.GAMEON_TOKEN_CACHE).
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        token = token_cache.get(cache_key)
+        if token is None:
+            user, token = super(CachedTokenAuthentication, self)\
+                .authenticate_credentials(key)
+            token_cache.set(cache_key, token)
+
+        # hand each request its own copies, since views may modify them
+        user = copy.copy(token.user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
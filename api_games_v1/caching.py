@@ -0,0 +1,258 @@
+"""
+Caching helpers for the API.
+
+The main piece here is the per-user ResponseCache, which stores serialized
+API responses under a per-user version number. Any write to a user's data
+bumps their version (see signals.py), which implicitly invalidates all of
+their cached responses at once; the stale entries are simply never read
+again, and age out of the backend's LRU eviction.
+
+Responses that have cheap validators (see conditional.py) are instead
+cached under their ETag, so an entry can only ever be read for the data
+it was built from, whichever process handled the write.
+
+The storage backend is pluggable via settings.GAMEON_RESPONSE_CACHE:
+- LocMemBackend (default) keeps entries in a bounded, in-process LRU
+- DjangoCacheBackend stores entries in one of the project's CACHES, which
+    lets multiple processes/servers share them (e.g. with memcached)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+MISSING = object()
+
+
+class LRUCache(object):
+    """
+    A simple thread-safe, in-process LRU cache with a maximum number of
+    entries, an optional TTL (in seconds) and hit/miss counters.
+    """
+
+    def __init__(self, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value, expires = self._data.get(key, (MISSING, None))
+            if value is not MISSING and expires and expires < time.time():
+                del self._data[key]
+                value = MISSING
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+########################################################
+# ResponseCache backends
+########################################################
+class LocMemBackend(object):
+    """
+    Stores entries in an in-process LRUCache. Each process has its own
+    cache (and its own versions), so this is only suitable for
+    single-process deployments.
+    """
+
+    def __init__(self, max_entries=1000, ttl=None):
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def incr(self, key, initial):
+        with self._lock:
+            value = self.cache.get(key)
+            value = initial if value is None else value + 1
+            self.cache.set(key, value)
+            return value
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        stats = self.cache.stats()
+        return {
+            'entries': stats['entries'],
+            'max_entries': stats['max_entries'],
+            'evictions': stats['evictions'],
+        }
+
+
+class DjangoCacheBackend(object):
+    """
+    Stores entries in one of the caches from settings.CACHES, so that they
+    can be shared between processes. Eviction and size limits are left
+    to the cache itself.
+    """
+
+    def __init__(self, alias='default', timeout=None):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def incr(self, key, initial):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, initial, None)
+            return initial
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return {}
+
+
+########################################################
+# ResponseCache
+########################################################
+def new_version():
+    # Versions start from the current time, so that if a version is
+    # ever evicted, its replacement can never match an older entry.
+    return int(time.time() * 1000000)
+
+
+def get_version(backend, version_key):
+    version = backend.get(version_key)
+    if version is None:
+        version = backend.incr(version_key, new_version())
+    return version
+
+
+class ResponseCache(object):
+    """
+    Per-user cache for serialized responses, invalidated by bumping
+    the user's version number. Hits and misses are counted per-process.
+
+    Entries are read and written with get_or_set(), which reads the
+    version once, before the response is built. If a write bumps the
+    version while the response is being built, the response is stored
+    under the old version, where it is never read.
+    """
+    prefix = 'gameon:response'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def version_key(self, user):
+        return '{}:version:{}'.format(self.prefix, user.pk)
+
+    def make_key(self, user, key):
+        return '{}:{}:{}:{}'.format(
+            self.prefix, user.pk,
+            get_version(self.backend, self.version_key(user)), key)
+
+    def _get_or_set(self, cache_key, compute):
+        value = self.backend.get(cache_key)
+        if value is None:
+            self.misses += 1
+            value = compute()
+            self.backend.set(cache_key, value)
+        else:
+            self.hits += 1
+        return value
+
+    def get_or_set(self, user, key, compute):
+        """
+        Returns the user's cached value for the key, or calls compute()
+        and caches the value it returns.
+        """
+        return self._get_or_set(self.make_key(user, key), compute)
+
+    def get_or_set_content(self, key, compute):
+        """
+        As get_or_set(), for a key that identifies the content itself
+        (i.e. an ETag, which changes whenever the response would), so
+        the entry never needs to be invalidated.
+        """
+        return self._get_or_set(
+            '{}:content:{}'.format(self.prefix, key), compute)
+
+    def invalidate(self, user):
+        self.backend.incr(self.version_key(user), new_version())
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return dict(self.backend.stats(), hits=self.hits, misses=self.misses)
+
+
+def load_backend(setting_name):
+    """
+    Builds the cache backend configured in the named setting
+    (see settings.GAMEON_RESPONSE_CACHE for an example).
+    """
+    config = getattr(settings, setting_name, {})
+    backend = import_string(
+        config.get('BACKEND', 'api_games_v1.caching.LocMemBackend'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def load_response_cache():
+    return ResponseCache(load_backend('GAMEON_RESPONSE_CACHE'))
+
+
+response_cache = load_response_cache()
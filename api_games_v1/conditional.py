@@ -0,0 +1,98 @@
+"""
+Support for conditional GET requests (i.e. ETag/If-None-Match and
+Last-Modified/If-Modified-Since), so that polling clients can be answered
+with a 304 before we do any of the work of serializing a response.
+"""
+import calendar
+import hashlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe,\
+    quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def latest(*dates):
+    """
+    Returns the most recent of the provided datetimes, ignoring any Nones.
+    """
+    dates = [d for d in dates if d is not None]
+    return max(dates) if dates else None
+
+
+class ConditionalGetMixin(object):
+    """
+    Mixin for API views that can cheaply tell whether their GET response
+    has changed, without building the response itself.
+
+    Views should implement get_validators(), which returns a tuple of:
+    - a list of values that change whenever the response would change
+        (e.g. a row count and the latest 'modified' date), or None if
+        the view cannot compute one (in which case the request is simply
+        handled as normal)
+    - the date the response was last modified, or None if there is no
+        reliable date (e.g. for lists, where deleting a row does not
+        change the latest 'modified' date)
+
+    The ETag is built from these values, along with the user, the full
+    path (i.e. including pagination params) and the rendered format, so
+    it is never shared between users or between pages. It is kept on the
+    view as 'etag' while the response is built (e.g. to cache it by).
+    """
+    etag = None
+
+    def get_validators(self):
+        raise NotImplementedError(
+            '{} must implement get_validators()'.format(
+                self.__class__.__name__))
+
+    def get_etag(self, values):
+        request = self.request
+        parts = [
+            request.user.pk,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        ] + list(values)
+        digest = hashlib.md5(
+            '|'.join(str(part) for part in parts).encode('utf-8'))
+        return 'W/' + quote_etag(digest.hexdigest())
+
+    def is_not_modified(self, etag, last_modified):
+        """
+        Checks the request's conditional headers against the validators.
+        If-None-Match takes precedence over If-Modified-Since when both are
+        present, per RFC 7232.
+        """
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or parse_etags(etag)[0] in etags
+        if_modified_since = parse_http_date_safe(
+            self.request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        if if_modified_since and last_modified:
+            return (calendar.timegm(last_modified.utctimetuple()) <=
+                    if_modified_since)
+        return False
+
+    def get(self, request, *args, **kwargs):
+        values, last_modified = self.get_validators()
+        if values is None:
+            return super(ConditionalGetMixin, self).get(
+                request, *args, **kwargs)
+
+        etag = self.etag = self.get_etag(values)
+        if self.is_not_modified(etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super(ConditionalGetMixin, self).get(
+                request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        if last_modified:
+            response['Last-Modified'] = http_date(
+                calendar.timegm(last_modified.utctimetuple()))
+        return response
@@ -0,0 +1,157 @@
+"""
+Fast read path for the list/detail views.
+
+DRF's ModelSerializer builds a set of field objects, and calls each one's
+to_representation() for every row, which costs more CPU than the queries
+themselves on large pages. The views here instead read just the columns
+they need with values(), and build the same JSON (including the key order)
+from those rows; the tests check the output against the serializers in
+serializers.py, so any change to those needs to be made here as well.
+The output is built from OrderedDicts, as the serializers' is, since plain
+dicts do not keep their key order on every supported Python version.
+
+The fast path can be switched off with settings.GAMEON_FAST_READS.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import GameDateRelation, TagGameRelation
+from .profiling import active_profile, serializing, timed
+
+# used for formatting datetimes exactly as the serializers do
+DATETIME_FIELD = serializers.DateTimeField()
+
+PLATFORM_FIELDS = ('id', 'title', 'created', 'modified')
+TAG_FIELDS = ('id', 'title')
+GAME_FIELDS = ('id', 'title', 'platform_id', 'platform__title', 'finished',
+               'created', 'modified')
+
+
+def fast_reads_enabled():
+    return getattr(settings, 'GAMEON_FAST_READS', True)
+
+
+def serialize_platforms(rows):
+    """
+    Matches PlatformSerializer.
+    """
+    format_datetime = DATETIME_FIELD.to_representation
+    return [OrderedDict([
+        ('id', row['id']),
+        ('title', row['title']),
+        ('created', format_datetime(row['created'])),
+        ('modified', format_datetime(row['modified'])),
+    ]) for row in rows]
+
+
+def serialize_tags(rows):
+    """
+    Matches TagSerializer.
+    """
+    return [OrderedDict([('id', row['id']), ('title', row['title'])])
+            for row in rows]
+
+
+def serialize_games(rows):
+    """
+    Matches GameReadSerializer. The dates and Tags for all of the Games
+    are read with one query each (as with the prefetches in game_queryset).
+    """
+    game_ids = [row['id'] for row in rows]
+    dates = defaultdict(list)
+    tags = defaultdict(list)
+    if game_ids:
+        for game_id, date in GameDateRelation.objects\
+                .filter(game__in=game_ids)\
+                .order_by('-date')\
+                .values_list('game_id', 'date'):
+            dates[game_id].append(str(date))
+        for pk, game_id, tag_id, tag_title in TagGameRelation.objects\
+                .filter(_game__in=game_ids)\
+                .order_by('pk')\
+                .values_list('pk', '_game_id', '_tag_id', '_tag__title'):
+            tags[game_id].append(OrderedDict([
+                ('id', pk),
+                ('_tag', OrderedDict([('id', tag_id), ('title', tag_title)])),
+            ]))
+
+    format_datetime = DATETIME_FIELD.to_representation
+    return [OrderedDict([
+        ('id', row['id']),
+        ('title', row['title']),
+        ('platform', OrderedDict([
+            ('id', row['platform_id']),
+            ('title', row['platform__title']),
+        ]) if row['platform_id'] else None),
+        ('finished', row['finished']),
+        ('dates', dates[row['id']]),
+        ('tags', tags[row['id']]),
+        ('created', format_datetime(row['created'])),
+        ('modified', format_datetime(row['modified'])),
+    ]) for row in rows]
+
+
+class FastReadMixin(object):
+    """
+    Mixin for list/detail views, which serves GET requests from the fast
+    read path (when it is enabled).
+
+    Views should specify the 'fast_fields' to read, and implement
+    serialize_rows() to build the response data from them. The rows are
+    read from get_queryset(), minus any prefetches (which do not apply to
+    values() querysets).
+
+    On both paths, the serializing is timed for the profiling middleware
+    (see profiling.py).
+    """
+    fast_fields = None
+
+    def serialize_rows(self, rows):
+        raise NotImplementedError(
+            '{} must implement serialize_rows()'.format(
+                self.__class__.__name__))
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super(FastReadMixin, self).get_serializer(
+            *args, **kwargs)
+        if active_profile() is not None:
+            # the serializer's data is built by to_representation()
+            serializer.to_representation = timed(
+                serializer.to_representation)
+        return serializer
+
+    def get_fast_queryset(self):
+        return self.get_queryset()\
+            .prefetch_related(None)\
+            .values(*self.fast_fields)
+
+    def list(self, request, *args, **kwargs):
+        if not fast_reads_enabled():
+            return super(FastReadMixin, self).list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_fast_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with serializing():
+                data = self.serialize_rows(page)
+            return self.get_paginated_response(data)
+        rows = list(queryset)
+        with serializing():
+            data = self.serialize_rows(rows)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not fast_reads_enabled():
+            return super(FastReadMixin, self).retrieve(
+                request, *args, **kwargs)
+        row = self.filter_queryset(self.get_fast_queryset())\
+            .filter(pk=self.kwargs['pk'])\
+            .first()
+        if row is None:
+            raise Http404
+        with serializing():
+            data = self.serialize_rows([row])[0]
+        return Response(data)
@@ -0,0 +1,377 @@
+"""
+Helpers for exporting and importing a user's entire library as a stream
+of records.
+
+Each record is a flat dict with a 'type' (see RECORD_TYPES), and records are
+always produced in dependency order (Platforms and Tags before the Games
+that refer to them, and Games before their Tags and dates), so that an
+export can be read back in a single pass.
+
+Rows are read in fixed-size chunks (keyed on pk), and imports are parsed
+and loaded in fixed-size chunks as well, so memory use stays (roughly)
+constant no matter how large the library is.
+"""
+import csv
+import datetime
+import itertools
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Game, GameDateRelation, PlatformModel, Tag,\
+    TagGameRelation
+
+CHUNK_SIZE = 1000
+
+# the types of record in an export, in the order they are exported,
+# along with the model and the fields exported for each
+RECORD_TYPES = (
+    ('platform', PlatformModel, ('id', 'title', 'created', 'modified')),
+    ('tag', Tag, ('id', 'title', 'created', 'modified')),
+    ('game', Game, ('id', 'title', 'platform', 'finished',
+                    'created', 'modified')),
+    ('game_tag', TagGameRelation, ('id', '_game', '_tag')),
+    ('date', GameDateRelation, ('id', 'game', 'date')),
+)
+
+# the columns used for CSV exports, which hold all of the record types
+CSV_COLUMNS = ('type', 'id', 'title', 'platform', 'finished',
+               'game', 'tag', 'date', 'created', 'modified')
+
+# the (front-end friendly) names used for relation fields in records
+FIELD_NAMES = {'_game': 'game', '_tag': 'tag'}
+
+
+def iterate_chunked(queryset, fields, chunk_size=CHUNK_SIZE):
+    """
+    Yields the specified fields (as dicts) for each row in the queryset,
+    reading them in chunks of 'chunk_size' rows, ordered by pk.
+    Each chunk is a separate, index-backed query (pk > last pk seen).
+    """
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk.values('pk', *fields)[:chunk_size])
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1]['pk']
+
+
+def export_records(owner, chunk_size=CHUNK_SIZE):
+    """
+    Yields every record in the owner's library.
+    """
+    for record_type, model, fields in RECORD_TYPES:
+        queryset = model.objects.filter(owner=owner)
+        for row in iterate_chunked(queryset, fields, chunk_size):
+            record = {'type': record_type}
+            for field in fields:
+                record[FIELD_NAMES.get(field, field)] = row[field]
+            yield record
+
+
+def to_ndjson(records):
+    """
+    Yields each record as a line of JSON.
+    """
+    encoder = DjangoJSONEncoder(sort_keys=True)
+    for record in records:
+        yield encoder.encode(record) + '\n'
+
+
+class EchoBuffer(object):
+    """
+    A file-like object for csv.writer that simply returns what is written,
+    rather than storing it, so that rows can be streamed.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def to_csv(records):
+    """
+    Yields a header line, followed by each record as a line of CSV.
+    """
+    writer = csv.DictWriter(EchoBuffer(), fieldnames=CSV_COLUMNS)
+    yield writer.writerow(dict(zip(CSV_COLUMNS, CSV_COLUMNS)))
+    for record in records:
+        yield writer.writerow(
+            {key: csv_value(value) for key, value in record.items()})
+
+
+EXPORT_FORMATS = {
+    'ndjson': (to_ndjson, 'application/x-ndjson'),
+    'csv': (to_csv, 'text/csv'),
+}
+
+
+########################################################
+# Import
+########################################################
+class LibraryImportError(Exception):
+    """
+    Raised when an import contains a record that cannot be loaded.
+    'number' is the line of the file that the record was read from.
+    """
+
+    def __init__(self, number, message):
+        self.number = number
+        super(LibraryImportError, self).__init__(
+            'Line {}: {}'.format(number, message))
+
+
+def decode_lines(lines):
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                raise LibraryImportError(number, 'Invalid UTF-8.')
+        yield line
+
+
+def read_ndjson(lines):
+    """
+    Yields (line number, record) for each (non-blank) line of JSON.
+    """
+    for number, line in enumerate(decode_lines(lines), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise LibraryImportError(number, 'Invalid JSON.')
+        if not isinstance(record, dict):
+            raise LibraryImportError(number, 'Expected a JSON object.')
+        yield number, record
+
+
+def read_csv(lines):
+    """
+    Yields (line number, record) for each row of CSV (after the header),
+    leaving out any empty columns.
+    """
+    reader = csv.DictReader(decode_lines(lines))
+    for row in reader:
+        yield reader.line_num, {
+            key: value for key, value in row.items() if value}
+
+
+IMPORT_FORMATS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+# the fields that are read from each type of record
+IMPORT_FIELDS = {
+    'platform': {'id': 'id', 'title': 'title'},
+    'tag': {'id': 'id', 'title': 'title'},
+    'game': {'id': 'id', 'title': 'title', 'platform': 'platform',
+             'finished': 'finished'},
+    'game_tag': {'game': '_game', 'tag': '_tag'},
+    'date': {'game': 'game', 'date': 'date'},
+}
+REQUIRED_FIELDS = {
+    'platform': ('id', 'title'),
+    'tag': ('id', 'title'),
+    'game': ('id', 'title'),
+    'game_tag': ('game', 'tag'),
+    'date': ('game', 'date'),
+}
+MODELS = {record_type: model for record_type, model, _ in RECORD_TYPES}
+
+
+def clean_records(records):
+    """
+    Validates and converts the values in each of the (line number, record)
+    pairs, yielding (line number, type, cleaned values) tuples.
+    """
+    for number, record in records:
+        record_type = record.get('type')
+        if record_type not in IMPORT_FIELDS:
+            raise LibraryImportError(number, 'Unknown type.')
+        for name in REQUIRED_FIELDS[record_type]:
+            if record.get(name) in (None, ''):
+                raise LibraryImportError(
+                    number, "Missing '{}'.".format(name))
+
+        model = MODELS[record_type]
+        values = {}
+        for name, field_name in IMPORT_FIELDS[record_type].items():
+            if record.get(name) in (None, ''):
+                continue
+            # validate relations against the ids they point to
+            field = model._meta.get_field(field_name)
+            while field.is_relation:
+                field = field.target_field
+            try:
+                values[name] = field.clean(record[name], None)
+            except ValidationError as e:
+                raise LibraryImportError(
+                    number, "'{}': {}".format(name, ' '.join(e.messages)))
+        yield number, record_type, values
+
+
+def chunk_records(records, chunk_size):
+    """
+    Groups consecutive records of the same type into chunks
+    of at most 'chunk_size' records.
+    """
+    for record_type, group in itertools.groupby(
+            records, key=lambda record: record[1]):
+        while True:
+            chunk = list(itertools.islice(group, chunk_size))
+            if not chunk:
+                break
+            yield record_type, chunk
+
+
+class LibraryImporter(object):
+    """
+    Loads a stream of records (e.g. from an export) into a user's library.
+
+    Platforms and Tags are matched by title against the user's existing
+    ones, and only created when there is no match. Games are always
+    created. The ids in the records are only used to link the records to
+    each other, and are mapped to the ids of the rows that are loaded.
+
+    Records are loaded in chunks, each in its own transaction, using a
+    fixed number of queries to match the chunk against existing rows.
+    Since most models inherit from the concrete BaseModel (and so cannot
+    be bulk inserted by Django), only the dates are inserted with
+    bulk_create(); everything else is saved row-by-row within the chunk's
+    transaction.
+    """
+
+    def __init__(self, owner, chunk_size=CHUNK_SIZE):
+        self.owner = owner
+        self.chunk_size = chunk_size
+        self.ids = {record_type: {} for record_type in MODELS}
+        self.counts = {record_type: 0 for record_type in MODELS}
+        self.created = {record_type: 0 for record_type in MODELS}
+        self.seconds = 0
+
+    def resolve(self, number, record_type, source_id):
+        try:
+            return self.ids[record_type][source_id]
+        except KeyError:
+            raise LibraryImportError(
+                number, 'Unknown {} {}.'.format(record_type, source_id))
+
+    def load_titled(self, record_type, chunk):
+        """
+        Loads Platforms/Tags, matching them by title to existing ones.
+        """
+        model = MODELS[record_type]
+        existing = dict(model.objects.filter(
+            owner=self.owner,
+            title__in={values['title'] for _, values in chunk},
+        ).values_list('title', 'pk'))
+        for _, values in chunk:
+            title = values['title']
+            if title not in existing:
+                existing[title] = model.objects.create(
+                    owner=self.owner, title=title).pk
+                self.created[record_type] += 1
+            self.ids[record_type][values['id']] = existing[title]
+
+    def load_games(self, chunk):
+        for number, values in chunk:
+            platform_id = None
+            if 'platform' in values:
+                platform_id = self.resolve(
+                    number, 'platform', values['platform'])
+            game = Game.objects.create(
+                owner=self.owner,
+                title=values['title'],
+                platform_id=platform_id,
+                finished=values.get('finished', False))
+            self.ids['game'][values['id']] = game.pk
+            self.created['game'] += 1
+
+    def load_game_tags(self, chunk):
+        pairs = {(self.resolve(number, 'game', values['game']),
+                  self.resolve(number, 'tag', values['tag']))
+                 for number, values in chunk}
+        existing = set(TagGameRelation.objects.filter(
+            owner=self.owner,
+            _game__in={game_id for game_id, _ in pairs},
+        ).values_list('_game', '_tag'))
+        for game_id, tag_id in sorted(pairs - existing):
+            TagGameRelation.objects.create(
+                owner=self.owner, _game_id=game_id, _tag_id=tag_id)
+            self.created['game_tag'] += 1
+
+    def load_dates(self, chunk):
+        pairs = {(self.resolve(number, 'game', values['game']),
+                  values['date'])
+                 for number, values in chunk}
+        existing = set(GameDateRelation.objects.filter(
+            owner=self.owner,
+            game__in={game_id for game_id, _ in pairs},
+        ).values_list('game', 'date'))
+        new_dates = [
+            GameDateRelation(owner=self.owner, game_id=game_id, date=date)
+            for game_id, date in sorted(pairs - existing)]
+        GameDateRelation.objects.bulk_create(new_dates)
+        # as with the date changes made through the API, save the Games
+        # too, since the conditional GET validators rely on their
+        # 'modified' dates to notice date changes
+        if new_dates:
+            Game.objects\
+                .filter(pk__in={date.game_id for date in new_dates})\
+                .update(modified=timezone.now())
+        self.created['date'] += len(new_dates)
+
+    def load_chunk(self, record_type, chunk):
+        chunk = [(number, values) for number, _, values in chunk]
+        with transaction.atomic():
+            if record_type in ('platform', 'tag'):
+                self.load_titled(record_type, chunk)
+            elif record_type == 'game':
+                self.load_games(chunk)
+            elif record_type == 'game_tag':
+                self.load_game_tags(chunk)
+            elif record_type == 'date':
+                self.load_dates(chunk)
+        self.counts[record_type] += len(chunk)
+
+    def run(self, records):
+        """
+        Loads all of the (raw) records, as (line number, record) pairs
+        from one of the IMPORT_FORMATS readers, and returns the stats.
+        """
+        started = time.time()
+        try:
+            for record_type, chunk in chunk_records(
+                    clean_records(records), self.chunk_size):
+                self.load_chunk(record_type, chunk)
+        finally:
+            self.seconds = time.time() - started
+        return self.stats()
+
+    def stats(self):
+        rows = sum(self.counts.values())
+        return {
+            'rows': rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(rows / self.seconds, 1)
+            if self.seconds else None,
+            'read': self.counts,
+            'created': self.created,
+        }
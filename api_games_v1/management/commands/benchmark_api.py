@@ -0,0 +1,252 @@
+import datetime
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api_games_v1.authentication import token_cache
+from api_games_v1.caching import response_cache
+from api_games_v1.models import Tag
+from api_games_v1.seed import seed_library
+
+PERCENTILES = (50, 90, 99)
+
+
+def build_routes(game_ids, tag_ids, platform_id):
+    """
+    Returns (name, method, path, data) for a request to each of the API's
+    routes. 'data' may be a callable, for request bodies that cannot be
+    reused (i.e. file uploads).
+    """
+    game_id = game_ids[0]
+    today = datetime.date.today().isoformat()
+    # a sync watermark from after the library was seeded
+    since = datetime.datetime.utcnow().isoformat() + 'Z'
+
+    def library_upload():
+        return {'file': SimpleUploadedFile('library.ndjson', b'\n'.join([
+            b'{"type": "platform", "id": 1, "title": "Benchmark Platform"}',
+            b'{"type": "game", "id": 1, "title": "Benchmark", '
+            b'"platform": 1}',
+            b'{"type": "date", "game": 1, "date": "2016-01-01"}',
+        ]))}
+
+    return [
+        # games
+        ('games-list', 'get', '/api/v1/games/', None),
+        ('games-list-cursor', 'get', '/api/v1/games/?paginate=cursor', None),
+        ('games-list-filtered', 'get',
+         '/api/v1/games/?search=game+1&finished=true&sort=title', None),
+        ('games-create', 'post', '/api/v1/games/', {
+            'title': 'Benchmark', 'platform': platform_id,
+            'dates': [today]}),
+        ('games-bulk', 'post', '/api/v1/games/bulk/', [{
+            'title': 'Benchmark {}'.format(i), 'platform': platform_id,
+            'dates': [today]} for i in range(50)]),
+        ('game-detail', 'get', '/api/v1/games/{}/'.format(game_id), None),
+        ('game-update', 'patch', '/api/v1/games/{}/'.format(game_id), {
+            'title': 'Renamed', 'dates': ['2016-01-01']}),
+        ('game-delete', 'delete', '/api/v1/games/{}/'.format(game_id), None),
+
+        # platforms
+        ('platforms-list', 'get', '/api/v1/platforms/', None),
+        ('platforms-create', 'post', '/api/v1/platforms/',
+         {'title': 'Benchmark'}),
+        ('platform-detail', 'get',
+         '/api/v1/platforms/{}/'.format(platform_id), None),
+        ('platform-update', 'patch',
+         '/api/v1/platforms/{}/'.format(platform_id), {'title': 'Renamed'}),
+        ('platform-delete', 'delete',
+         '/api/v1/platforms/{}/'.format(platform_id), None),
+
+        # tags
+        ('tags-list', 'get', '/api/v1/tags/', None),
+        ('tags-create', 'post', '/api/v1/tags/', {'title': 'Benchmark'}),
+        ('tag-delete', 'delete',
+         '/api/v1/tags/delete/{}/'.format(tag_ids[0]), None),
+        ('tag-relation-create', 'post', '/api/v1/tag-relations/',
+         {'_game': game_id, 'tag_title': 'Benchmark'}),
+        ('tag-relation-delete', 'delete', '/api/v1/tag-relations/delete/',
+         {'game_id': game_id, 'tag_id': tag_ids[0]}),
+        ('tag-relations-bulk', 'post', '/api/v1/tag-relations/bulk/', {
+            'action': 'add', 'games': game_ids[:100],
+            'tags': tag_ids[:2], 'tag_titles': ['Benchmark']}),
+
+        # bootstrap, library, stats and metrics
+        ('bootstrap', 'get', '/api/v1/bootstrap/', None),
+        ('sync', 'get', '/api/v1/sync/?since={}'.format(since), None),
+        ('changes', 'get', '/api/v1/changes/', None),
+        ('library-export-ndjson', 'get', '/api/v1/library/export/ndjson/',
+         None),
+        ('library-export-csv', 'get', '/api/v1/library/export/csv/', None),
+        ('library-import-ndjson', 'post', '/api/v1/library/import/ndjson/',
+         library_upload),
+        ('stats', 'get', '/api/v1/stats/', None),
+        ('metrics', 'get', '/api/v1/metrics/', None),
+
+        # rest-auth
+        ('rest-auth-user', 'get', '/rest-auth/user/', None),
+        ('rest-auth-profile', 'get', '/rest-auth/user/profile/', None),
+    ]
+
+
+def percentile(timings, percent):
+    """
+    Returns the nearest-rank percentile of the (sorted) timings.
+    """
+    index = max(0, int(round(percent / 100.0 * len(timings))) - 1)
+    return timings[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks every API route against a seeded synthetic library, '
+            'recording latency percentiles, query counts and peak memory as '
+            'JSON. Runs in a transaction that is rolled back, against the '
+            'configured database (e.g. SQLite or Postgres).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1000)
+        parser.add_argument('--platforms', type=int, default=20)
+        parser.add_argument('--dates-per-game', type=int, default=3)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--tags-per-game', type=int, default=3)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Number of timed requests per route.')
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help='Only benchmark the named route(s).')
+        parser.add_argument(
+            '--output', help='Write the JSON results to this file, '
+                             'rather than to stdout.')
+
+    def request(self, client, method, path, data, queries=None):
+        """
+        Makes a single request, rolling back any writes it makes so that
+        it can be repeated. Returns the response and the time it took.
+        If a list is passed for 'queries', the request's queries are
+        added to it.
+        """
+        if callable(data):
+            data = data()
+        kwargs = {'format': 'multipart' if method == 'post' and
+                  isinstance(data, dict) and 'file' in data else 'json'}
+        sid = transaction.savepoint()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.time()
+            response = getattr(client, method)(path, data, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            seconds = time.time() - started
+        if queries is not None:
+            queries.extend(captured)
+        transaction.savepoint_rollback(sid)
+        return response, seconds
+
+    def benchmark_route(self, client, method, path, data, count):
+        # the first request is made with empty caches, and is used
+        # for the query count and peak memory
+        response_cache.clear()
+        token_cache.clear()
+        queries = []
+        tracemalloc.start()
+        response, cold_seconds = self.request(
+            client, method, path, data, queries)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings = sorted(
+            self.request(client, method, path, data)[1] * 1000
+            for _ in range(max(count, 1)))
+        result = {
+            'status': response.status_code,
+            'queries': len(queries),
+            'peak_memory_kb': round(peak_memory / 1024.0, 1),
+            'cold_ms': round(cold_seconds * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+        }
+        for percent in PERCENTILES:
+            result['p{}_ms'.format(percent)] = round(
+                percentile(timings, percent), 3)
+        return result
+
+    def handle(self, *args, **options):
+        sizes = {key: options[key] for key in (
+            'games', 'platforms', 'dates_per_game', 'tags', 'tags_per_game')}
+        sizes['games'] = max(sizes['games'], 1)
+        sizes['platforms'] = max(sizes['platforms'], 1)
+        sizes['tags'] = max(sizes['tags'], 1)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+                'database': connection.vendor,
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'requests': options['requests'],
+                'library': sizes,
+            },
+            'routes': {},
+        }
+        try:
+            # profiling is disabled, since it would only be applied
+            # to a random sample of the requests
+            with transaction.atomic(), override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    GAMEON_PROFILING={'SAMPLE_RATE': 0}):
+                started = time.time()
+                user = get_user_model().objects.create_user(
+                    'benchmark-{}'.format(int(time.time())), is_staff=True)
+                game_ids = seed_library(user, **sizes)
+                results['meta']['seed_seconds'] = round(
+                    time.time() - started, 3)
+                tag_ids = list(Tag.objects.filter(owner=user)
+                               .order_by('pk').values_list('pk', flat=True))
+                platform_id = user.platformmodel_set.values_list(
+                    'pk', flat=True).first()
+
+                client = APIClient()
+                client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+                    Token.objects.create(user=user).key))
+                for name, method, path, data in build_routes(
+                        game_ids, tag_ids, platform_id):
+                    if options['routes'] and name not in options['routes']:
+                        continue
+                    results['routes'][name] = self.benchmark_route(
+                        client, method, path, data, options['requests'])
+                    self.stderr.write('{:<24} {}'.format(
+                        name, results['routes'][name]))
+                raise Rollback
+        except Rollback:
+            pass
+
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
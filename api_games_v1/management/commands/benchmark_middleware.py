@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+from api_games_v1.middleware import ApiFastPathMixin
+
+
+def stock_middleware():
+    """
+    Returns settings.MIDDLEWARE_CLASSES with each of the fast-path
+    classes replaced by the standard middleware it extends.
+    """
+    classes = []
+    for path in settings.MIDDLEWARE_CLASSES:
+        cls = import_string(path)
+        if issubclass(cls, ApiFastPathMixin):
+            cls = [base for base in cls.__bases__
+                   if base is not ApiFastPathMixin][0]
+            path = '{}.{}'.format(cls.__module__, cls.__name__)
+        classes.append(path)
+    return tuple(classes)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measures the latency of token-authenticated API requests through '
+            'the request pipeline, with the standard middleware and with the '
+            'API fast path. Runs in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/api/v1/platforms/',
+            help='The URL to request.')
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Number of requests timed for each middleware stack.')
+
+    def time_requests(self, middleware, path, token, count):
+        with override_settings(MIDDLEWARE_CLASSES=middleware,
+                               ALLOWED_HOSTS=['testserver']):
+            client = Client(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+            # the first request loads the middleware and warms the caches
+            client.get(path)
+            timings = []
+            for _ in range(count):
+                started = time.time()
+                client.get(path)
+                timings.append((time.time() - started) * 1000)
+        timings.sort()
+        return {
+            'mean': sum(timings) / len(timings),
+            'median': timings[len(timings) // 2],
+            'p95': timings[int(len(timings) * 0.95)],
+        }
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    'benchmark-{}'.format(int(time.time())))
+                token = Token.objects.create(user=user)
+                for name, middleware in (
+                        ('standard', stock_middleware()),
+                        ('fast path', settings.MIDDLEWARE_CLASSES)):
+                    results.append((name, self.time_requests(
+                        middleware, options['path'], token,
+                        options['requests'])))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write('{} requests to {}:'.format(
+            options['requests'], options['path']))
+        for name, timing in results:
+            self.stdout.write(
+                '  {:<10} mean {mean:.3f}ms, median {median:.3f}ms, '
+                'p95 {p95:.3f}ms'.format(name, **timing))
@@ -0,0 +1,84 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api_games_v1.fast_serializers import GAME_FIELDS, PLATFORM_FIELDS,\
+    TAG_FIELDS, serialize_games, serialize_platforms, serialize_tags
+from api_games_v1.models import Game, PlatformModel, Tag
+from api_games_v1.seed import seed_library
+from api_games_v1.serializers import GameReadSerializer, PlatformSerializer,\
+    TagSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compares the rows/sec of the fast read path with the DRF '
+            'serializers, for the Games, Platforms and Tags in a seeded '
+            'library (reading and serializing every row). Runs in a '
+            'transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=5000)
+        parser.add_argument('--platforms', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=1000)
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of runs for each path; the best is reported.')
+
+    def rows_per_second(self, read, repeat):
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.time()
+            rows = len(read())
+            seconds = time.time() - started
+            best = seconds if best is None else min(best, seconds)
+        return rows, rows / best if best else None
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                owner = get_user_model().objects.create_user(
+                    'benchmark-{}'.format(int(time.time())))
+                seed_library(owner, games=options['games'],
+                             platforms=options['platforms'],
+                             dates_per_game=3, tags=options['tags'],
+                             tags_per_game=3)
+                games = Game.objects.filter(owner=owner)
+                platforms = PlatformModel.objects.filter(owner=owner)
+                tags = Tag.objects.filter(owner=owner)
+
+                benchmarks = (
+                    ('games', lambda: GameReadSerializer(
+                        games.select_related('platform')
+                        .prefetch_related('dates', 'tags___tag'),
+                        many=True).data,
+                     lambda: serialize_games(games.values(*GAME_FIELDS))),
+                    ('platforms', lambda: PlatformSerializer(
+                        platforms, many=True).data,
+                     lambda: serialize_platforms(
+                        platforms.values(*PLATFORM_FIELDS))),
+                    ('tags', lambda: TagSerializer(tags, many=True).data,
+                     lambda: serialize_tags(tags.values(*TAG_FIELDS))),
+                )
+                for name, serializer, fast in benchmarks:
+                    rows, serializer_rate = self.rows_per_second(
+                        serializer, options['repeat'])
+                    _, fast_rate = self.rows_per_second(
+                        fast, options['repeat'])
+                    results.append((name, rows, serializer_rate, fast_rate))
+                raise Rollback
+        except Rollback:
+            pass
+
+        for name, rows, serializer_rate, fast_rate in results:
+            self.stdout.write(
+                '{:<10} {:>7} rows: serializer {:>10.0f} rows/sec, '
+                'fast {:>10.0f} rows/sec ({:.1f}x)'.format(
+                    name, rows, serializer_rate, fast_rate,
+                    fast_rate / serializer_rate))
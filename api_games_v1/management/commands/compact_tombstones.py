@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api_games_v1.sync import compact_tombstones, sync_setting
+
+
+class Command(BaseCommand):
+    help = ('Deletes the delta sync Tombstones that are older than the '
+            'retention period. Should be run regularly (e.g. daily).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=sync_setting('TOMBSTONE_RETENTION_DAYS', 30),
+            help='Retention period; defaults to '
+                 'GAMEON_SYNC[\'TOMBSTONE_RETENTION_DAYS\'].')
+
+    def handle(self, *args, **options):
+        deleted = compact_tombstones(
+            timezone.now() - datetime.timedelta(days=options['days']))
+        self.stdout.write('Deleted {} Tombstone(s).'.format(deleted))
@@ -0,0 +1,58 @@
+import io
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api_games_v1.library import CHUNK_SIZE, IMPORT_FORMATS,\
+    LibraryImporter, LibraryImportError
+from api_games_v1.signals import send_data_changed
+
+
+class Command(BaseCommand):
+    help = ('Imports a library export (NDJSON or CSV) into '
+            'the specified user\'s library.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=sorted(IMPORT_FORMATS), dest='import_format',
+            help='Defaults to the file\'s extension.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Number of records loaded per transaction.')
+
+    def handle(self, *args, **options):
+        try:
+            owner = get_user_model().objects.get(
+                username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(
+                'User "{}" does not exist.'.format(options['username']))
+
+        import_format = options['import_format'] or \
+            os.path.splitext(options['path'])[1].lstrip('.')
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(
+                'Unknown format "{}"; use --format.'.format(import_format))
+
+        importer = LibraryImporter(owner, chunk_size=options['chunk_size'])
+        with io.open(options['path'], encoding='utf-8', newline='') as f:
+            try:
+                importer.run(IMPORT_FORMATS[import_format](f))
+            except LibraryImportError as e:
+                raise CommandError('{} (loaded so far: {})'.format(
+                    e, importer.stats()))
+            finally:
+                send_data_changed(
+                    self.__class__, owner,
+                    'games', 'dates', 'platforms', 'tags')
+
+        stats = importer.stats()
+        self.stdout.write(
+            'Loaded {rows} records in {seconds}s '
+            '({rows_per_second} rows/sec).'.format(**stats))
+        for record_type, count in sorted(stats['read'].items()):
+            self.stdout.write('  {}: {} read, {} created'.format(
+                record_type, count, stats['created'][record_type]))
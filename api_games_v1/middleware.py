@@ -0,0 +1,200 @@
+"""
+Middleware for the API.
+
+API fast path
+-------------
+The browser-only middleware (sessions, CSRF, messages, etc.) does nothing
+useful for API requests that authenticate with a token, but still costs
+time on every request (e.g. the session middleware reads the session
+cookie, and the auth middleware sets up a lazy user from the session).
+The subclasses here skip their parent middleware entirely for those
+requests, and behave exactly like it for everything else (the admin, the
+Index view, and the rest_auth login/logout/registration endpoints, which
+need sessions).
+
+Profiling
+---------
+ProfilingMiddleware records metrics for a sample of requests
+(see profiling.py).
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware,\
+    SessionAuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+from .profiling import activate, registry, repeated_shapes
+
+logger = logging.getLogger(__name__)
+
+# URL prefixes where token requests can skip the browser-only middleware
+FAST_PATH_PREFIXES = getattr(
+    settings, 'GAMEON_API_FAST_PATH_PREFIXES', ('/api/', '/rest-auth/user/'))
+
+
+def is_api_token_request(request):
+    """
+    Returns True for requests to the API that authenticate with a token.
+    The result is stored on the request, since every middleware asks.
+    """
+    try:
+        return request._api_token_request
+    except AttributeError:
+        request._api_token_request = (
+            request.path_info.startswith(FAST_PATH_PREFIXES) and
+            request.META.get('HTTP_AUTHORIZATION', '').startswith('Token '))
+        return request._api_token_request
+
+
+class ApiFastPathMixin(object):
+    """
+    Mixin for middleware classes that should be skipped for API token
+    requests (see is_api_token_request()).
+    """
+
+    def process_request(self, request):
+        parent = getattr(
+            super(ApiFastPathMixin, self), 'process_request', None)
+        if parent is None or is_api_token_request(request):
+            return None
+        return parent(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        parent = getattr(
+            super(ApiFastPathMixin, self), 'process_view', None)
+        if parent is None or is_api_token_request(request):
+            return None
+        return parent(request, view_func, view_args, view_kwargs)
+
+    def process_response(self, request, response):
+        parent = getattr(
+            super(ApiFastPathMixin, self), 'process_response', None)
+        if parent is None or is_api_token_request(request):
+            return response
+        return parent(request, response)
+
+
+class ApiSessionMiddleware(ApiFastPathMixin, SessionMiddleware):
+    pass
+
+
+class ApiCsrfViewMiddleware(ApiFastPathMixin, CsrfViewMiddleware):
+    pass
+
+
+class ApiAuthenticationMiddleware(ApiFastPathMixin, AuthenticationMiddleware):
+    pass
+
+
+class ApiSessionAuthenticationMiddleware(
+        ApiFastPathMixin, SessionAuthenticationMiddleware):
+    pass
+
+
+class ApiMessageMiddleware(ApiFastPathMixin, MessageMiddleware):
+    pass
+
+
+class ApiXFrameOptionsMiddleware(ApiFastPathMixin, XFrameOptionsMiddleware):
+    pass
+
+
+########################################################
+# Profiling
+########################################################
+class ProfilingMiddleware(object):
+    """
+    Records the wall time, database queries and time, and serializing and
+    rendering time of a random sample of requests, per URL pattern, and
+    flags requests that repeat the same SQL shape (i.e. likely N+1
+    patterns).
+
+    Configured with settings.GAMEON_PROFILING:
+    - SAMPLE_RATE: fraction of requests to profile; 0 disables the
+        middleware entirely
+    - N_PLUS_ONE_THRESHOLD: how many times a SQL shape has to repeat
+        within a request to be flagged
+
+    Queries are captured (for sampled requests only) by forcing Django's
+    debug cursor on, which is what assertNumQueries() does as well.
+    This should be the first middleware, so that its timings cover the
+    rest of the stack.
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'GAMEON_PROFILING', {})
+        self.sample_rate = config.get('SAMPLE_RATE', 0)
+        self.n_plus_one_threshold = config.get('N_PLUS_ONE_THRESHOLD', 5)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        if random.random() >= self.sample_rate:
+            activate(None)
+            return None
+        capture = []
+        for connection in connections.all():
+            capture.append((connection, connection.force_debug_cursor,
+                            len(connection.queries_log)))
+            connection.force_debug_cursor = True
+        request._profile = {
+            'started': time.time(),
+            'capture': capture,
+            'serialize_seconds': 0,
+            'serializing': False,
+            'render_seconds': 0,
+        }
+        activate(request._profile)
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile['render_started'] = time.time()
+
+            def render_finished(response):
+                profile['render_seconds'] = \
+                    time.time() - profile['render_started']
+            response.add_post_render_callback(render_finished)
+        return response
+
+    def process_response(self, request, response):
+        profile = getattr(request, '_profile', None)
+        if profile is None:
+            return response
+        activate(None)
+        seconds = time.time() - profile['started']
+
+        queries = []
+        for connection, force_debug_cursor, start in profile['capture']:
+            connection.force_debug_cursor = force_debug_cursor
+            # the log is a bounded deque, so it may have dropped entries
+            log = list(connection.queries_log)
+            queries += log[min(start, len(log)):]
+
+        match = getattr(request, 'resolver_match', None)
+        labels = (('route', match.view_name if match else 'unmatched'),
+                  ('method', request.method))
+        registry.observe('gameon_request_duration_seconds', labels, seconds)
+        registry.observe('gameon_request_queries', labels, len(queries))
+        registry.observe('gameon_request_db_duration_seconds', labels,
+                         sum(float(query['time']) for query in queries))
+        registry.observe('gameon_request_serialize_duration_seconds', labels,
+                         profile['serialize_seconds'])
+        registry.observe('gameon_request_render_duration_seconds', labels,
+                         profile['render_seconds'])
+
+        repeated = repeated_shapes(queries, self.n_plus_one_threshold)
+        if repeated:
+            registry.inc('gameon_request_n_plus_one_total', labels)
+            for shape, count in repeated:
+                logger.warning('Possible N+1 in %s %s: %d queries like %s',
+                               request.method, request.path, count, shape)
+        return response
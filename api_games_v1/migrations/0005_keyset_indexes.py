@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:26
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_games_v1', '0004_game_finished'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='gamedaterelation',
+            options={'ordering': ['-date']},
+        ),
+        migrations.AlterIndexTogether(
+            name='basemodel',
+            index_together=set([('modified', 'id'), ('created', 'id')]),
+        ),
+    ]
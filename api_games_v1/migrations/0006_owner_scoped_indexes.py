@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:26
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_tag_relations(apps, schema_editor):
+    """
+    Removes any duplicate TagGameRelations (keeping the oldest of each)
+    so that the unique constraint below can be applied.
+    """
+    TagGameRelation = apps.get_model('api_games_v1', 'TagGameRelation')
+    duplicates = TagGameRelation.objects\
+        .values('owner', '_tag', '_game')\
+        .annotate(keep=Min('pk'), total=Count('pk'))\
+        .filter(total__gt=1)
+    for dupe in duplicates:
+        TagGameRelation.objects.filter(
+            owner=dupe['owner'],
+            _tag=dupe['_tag'],
+            _game=dupe['_game'],
+        ).exclude(pk=dupe['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_games_v1', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_tag_relations, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='taggamerelation',
+            unique_together=set([('owner', '_tag', '_game')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='game',
+            index_together=set([('owner', 'title')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='gamedaterelation',
+            index_together=set([('owner', 'game', 'date')]),
+        ),
+    ]
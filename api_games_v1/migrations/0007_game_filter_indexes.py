@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:36
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+INDEX_NAME = 'api_games_v1_game_title_search'
+
+# Case-insensitive title index, for the 'title' (prefix) and 'search'
+# (substring) filters on GameList. Django runs both lookups as a LIKE on
+# UPPER(title) on Postgres, so a trigram index on that expression serves
+# both prefix and substring matches.
+#
+# There is no equivalent on SQLite: it can only use an index for LIKE
+# when the pattern is a literal, and Django always passes it as a
+# parameter. There, the (owner, title) index is the fallback, which
+# limits the match to a scan of the owner's titles within the index.
+CREATE_INDEX_SQL = {
+    'postgresql': [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'CREATE INDEX {} ON api_games_v1_game '
+        'USING gin (UPPER(title::text) gin_trgm_ops)'.format(INDEX_NAME),
+    ],
+}
+
+
+def create_title_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for sql in CREATE_INDEX_SQL.get(vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX_SQL:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_games_v1', '0006_owner_scoped_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='game',
+            index_together=set([
+                ('owner', 'title'),
+                ('owner', 'platform'),
+                ('owner', 'finished'),
+            ]),
+        ),
+        migrations.RunPython(create_title_index, drop_title_index),
+    ]
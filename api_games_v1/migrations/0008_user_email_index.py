@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+INDEX_NAME = 'auth_user_email_upper'
+
+# Case-insensitive index on the User's email, for the email__iexact
+# lookup in EmailExistsCheck. Django runs iexact as a comparison on
+# UPPER(email) on Postgres, so the index is on that expression. On SQLite,
+# iexact is a LIKE with a parameter, which can never use an index, so
+# there is nothing to add there.
+
+
+def create_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    schema_editor.execute('CREATE INDEX {} ON {} (UPPER(email::text))'.format(
+        INDEX_NAME, schema_editor.quote_name(table)))
+
+
+def drop_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api_games_v1', '0007_game_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:48
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_duplicate_profiles(apps, schema_editor):
+    """
+    Removes any duplicate UserProfiles (keeping the oldest for each User)
+    so that the unique constraint below can be applied. Duplicates could
+    only be created by concurrent first requests, and could not be read
+    or updated afterwards, so the oldest is as good as any.
+    """
+    UserProfile = apps.get_model('api_games_v1', 'UserProfile')
+    duplicates = UserProfile.objects\
+        .values('owner')\
+        .annotate(keep=Min('pk'), total=Count('pk'))\
+        .filter(total__gt=1)
+    for dupe in duplicates:
+        UserProfile.objects.filter(owner=dupe['owner'])\
+            .exclude(pk=dupe['keep'])\
+            .delete()
+
+
+def create_missing_profiles(apps, schema_editor):
+    """
+    Creates a UserProfile for any existing User without one, since
+    Profiles are now created at signup rather than on first read.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserProfile = apps.get_model('api_games_v1', 'UserProfile')
+    for user in User.objects.filter(profile__isnull=True).iterator():
+        UserProfile.objects.create(owner=user)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_games_v1', '0008_user_email_index'),
+    ]
+
+    # the new Profiles are created after the constraint is applied, since
+    # Postgres cannot alter a table that has pending (deferred) FK checks
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_profiles, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='owner',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(
+            create_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:53
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api_games_v1', '0009_unique_user_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('games', 'Game'), ('platforms', 'Platform'), ('tags', 'Tag'), ('tag_relations', 'Tag relation'), ('dates', 'Date')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='gamedaterelation',
+            index_together=set([('owner', 'modified'), ('owner', 'game', 'date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='tombstone',
+            index_together=set([('owner', 'deleted')]),
+        ),
+    ]
@@ -9,14 +9,23 @@ class BaseModel(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # these back the keyset (cursor) pagination on list views
+        index_together = (
+            ('created', 'id'),
+            ('modified', 'id'),
+        )
+
 
 class UserProfile(BaseModel):
     """
     Basic profile to attach to user accounts. Used for storing
     information and preferences for a user that are not a part of
     the user/auth model.
+
+    Each User has (at most) one Profile, which is created at signup.
     """
-    owner = models.ForeignKey(User)
+    owner = models.OneToOneField(User, related_name='profile')
     first_name = models.CharField(max_length=100, blank=True)
     last_name = models.CharField(max_length=100, blank=True)
 
@@ -47,6 +56,15 @@ class Game(BaseModel):
         PlatformModel, related_name="games", blank=True, null=True)
     finished = models.BooleanField(default=False)
 
+    class Meta:
+        # these back the filters/sorting on GameList (see also the
+        # Postgres-only title search index in migration 0007)
+        index_together = (
+            ('owner', 'title'),
+            ('owner', 'platform'),
+            ('owner', 'finished'),
+        )
+
     def __str__(self):
         return self.title
 
@@ -76,6 +94,9 @@ class TagGameRelation(BaseModel):
     _tag = models.ForeignKey(Tag)
     _game = models.ForeignKey(Game, related_name="tags")
 
+    class Meta:
+        unique_together = ('owner', '_tag', '_game')
+
     def __str__(self):
         return 'Game: {} | Tag: {}'.format(
             str(self._game), str(self._tag))
@@ -94,7 +115,41 @@ class GameDateRelation(models.Model):
 
     class Meta:
         unique_together = ('owner', 'date', 'game')
+        index_together = (
+            ('owner', 'game', 'date'),
+            # backs the changes-since queries for delta sync
+            ('owner', 'modified'),
+        )
         ordering = ['-date']
 
     def __str__(self):
         return str(self.date)
+
+
+class Tombstone(models.Model):
+    """
+    A record of a deleted object, so that delta sync clients can remove
+    their copy of it (see sync.py). Old Tombstones are removed by the
+    compact_tombstones command.
+
+    Like GameDateRelation, this does not extend BaseModel, so that
+    Tombstones can be created with bulk_create().
+    """
+    KIND_CHOICES = (
+        ('games', 'Game'),
+        ('platforms', 'Platform'),
+        ('tags', 'Tag'),
+        ('tag_relations', 'Tag relation'),
+        ('dates', 'Date'),
+    )
+
+    owner = models.ForeignKey(User)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    deleted = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        index_together = ('owner', 'deleted')
+
+    def __str__(self):
+        return '{} {}'.format(self.kind, self.object_id)
@@ -0,0 +1,130 @@
+"""
+Change notifications, so that clients can wait for their data to change
+instead of polling for it (see views_notifications.py).
+
+Every owner_data_changed signal is published to a broker (see receivers.py),
+which keeps a sequence number for each user, along with the kinds of data
+that changed in their recent events. A client holds on to the sequence
+number from its last response, and waits for it to move on.
+
+The broker is pluggable via settings.GAMEON_NOTIFICATIONS. LocalBroker
+(the default) only sees the writes made by its own process, so any
+deployment running multiple processes needs a broker that shares events
+between them (e.g. built on Redis pub/sub); it only needs to implement
+publish() and wait() as LocalBroker does.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LocalBroker(object):
+    """
+    In-process broker, which wakes up the waiting threads directly.
+    Up to 'history' events are kept for each user.
+    """
+
+    def __init__(self, history=50):
+        self.history = history
+        self._events = defaultdict(lambda: deque(maxlen=self.history))
+        self._sequences = {}
+        # the first sequence number issued for each user
+        self._bases = {}
+        self._condition = threading.Condition()
+
+    def new_sequence(self):
+        # Sequences start from the current time, so that after a restart
+        # they never go back to a number that a client has already seen.
+        return int(time.time() * 1000000)
+
+    def get_sequence(self, owner_id):
+        with self._condition:
+            return self._current(owner_id)
+
+    def _current(self, owner_id):
+        if owner_id not in self._sequences:
+            self._sequences[owner_id] = self._bases[owner_id] = \
+                self.new_sequence()
+        return self._sequences[owner_id]
+
+    def publish(self, owner_id, kinds):
+        with self._condition:
+            sequence = self._current(owner_id) + 1
+            self._sequences[owner_id] = sequence
+            self._events[owner_id].append((sequence, frozenset(kinds)))
+            self._condition.notify_all()
+
+    def wait(self, owner_id, after, timeout):
+        """
+        Waits up to 'timeout' seconds for an event after the 'after'
+        sequence number. Returns the current sequence number, and the
+        kinds of data that have changed since 'after': an empty set if
+        nothing has, or None if the events have been dropped from the
+        history, in which case the client should assume everything has.
+
+        A sequence number that this broker never issued (i.e. one from
+        another process, or from before a restart) cannot be compared
+        with its own, so the client is reset to the current sequence
+        number and waits from there.
+        """
+        with self._condition:
+            current = self._current(owner_id)
+            if not self._bases[owner_id] <= after <= current:
+                after = current
+            self._condition.wait_for(
+                lambda: self._current(owner_id) != after, timeout)
+            sequence = self._current(owner_id)
+            if sequence == after:
+                return sequence, frozenset()
+            events = [(number, kinds) for number, kinds
+                      in self._events.get(owner_id, ()) if number > after]
+            if not events or events[0][0] != after + 1:
+                return sequence, None
+            return sequence, frozenset().union(
+                *(kinds for _, kinds in events))
+
+    def clear(self):
+        with self._condition:
+            self._events.clear()
+            self._sequences.clear()
+            self._bases.clear()
+
+
+class WaiterLimit(object):
+    """
+    Counts the requests that are waiting in this process, so that they
+    can be kept well below the number of worker threads.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, limit):
+        """
+        Returns True (and counts the caller as waiting) if fewer than
+        'limit' requests are already waiting.
+        """
+        with self._lock:
+            if self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.count -= 1
+
+
+def load_broker():
+    config = getattr(settings, 'GAMEON_NOTIFICATIONS', {})
+    broker = import_string(config.get(
+        'BACKEND', 'api_games_v1.notifications.LocalBroker'))
+    return broker(**config.get('OPTIONS', {}))
+
+
+broker = load_broker()
+waiters = WaiterLimit()
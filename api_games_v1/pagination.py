@@ -0,0 +1,56 @@
+from rest_framework import pagination
+
+
+class OptionalCursorPagination(pagination.PageNumberPagination):
+    """
+    Default pagination class for the API.
+
+    Uses standard page number pagination, unless the request opts in to
+    cursor (keyset) pagination, either with '?paginate=cursor' or by passing
+    a 'cursor' from a previous page. Cursor pagination does not need to run
+    a COUNT(*) or skip over an OFFSET of rows, so every page costs the same
+    regardless of how deep into the list it is.
+
+    Views can specify the ordering to use for the cursor with a
+    'cursor_ordering' attribute; the first field is used as the cursor key,
+    so it should be backed by an index, with 'id' as a tie-breaker.
+    """
+    mode_query_param = 'paginate'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-created', '-id')
+
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor' or
+                self.cursor_query_param in request.query_params)
+
+    def get_cursor_paginator(self, view):
+        paginator = pagination.CursorPagination()
+        paginator.cursor_query_param = self.cursor_query_param
+        paginator.page_size = self.page_size
+        paginator.ordering = getattr(
+            view, 'cursor_ordering', self.cursor_ordering)
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.get_cursor_paginator(view)
+            page = self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+            self.display_page_controls = \
+                self.cursor_paginator.display_page_controls
+            return page
+        return super(OptionalCursorPagination, self).paginate_queryset(
+            queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super(OptionalCursorPagination, self)\
+            .get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator:
+            return self.cursor_paginator.to_html()
+        return super(OptionalCursorPagination, self).to_html()
@@ -0,0 +1,203 @@
+"""
+In-process request metrics, recorded by ProfilingMiddleware (see
+middleware.py) and exposed in the Prometheus text format by MetricsView.
+
+Metrics are aggregated per process, per URL pattern (the resolved view
+name) and method, as histograms. They are reset when the process restarts,
+so the scraper should treat them as counters that may reset.
+
+Serialization (building the response data from the models or rows,
+including any queries that it makes along the way) is timed separately
+from rendering (turning that data into JSON), by wrapping it in
+serializing() or timed(); see FastReadMixin and BootstrapView.
+"""
+import functools
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+# buckets for durations (in seconds) and query counts
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# each metric's name, along with its type, help text and buckets
+METRICS = OrderedDict([
+    ('gameon_request_duration_seconds', (
+        'histogram', 'Wall time of sampled requests.', DURATION_BUCKETS)),
+    ('gameon_request_queries', (
+        'histogram', 'Database queries per sampled request.', QUERY_BUCKETS)),
+    ('gameon_request_db_duration_seconds', (
+        'histogram', 'Database time of sampled requests.', DURATION_BUCKETS)),
+    ('gameon_request_serialize_duration_seconds', (
+        'histogram', 'Time spent serializing the data of sampled responses.',
+        DURATION_BUCKETS)),
+    ('gameon_request_render_duration_seconds', (
+        'histogram', 'Time spent rendering sampled responses (to JSON).',
+        DURATION_BUCKETS)),
+    ('gameon_request_n_plus_one_total', (
+        'counter', 'Sampled requests that repeated the same SQL shape.',
+        None)),
+])
+
+
+class Histogram(object):
+    """
+    A cumulative histogram, as used by Prometheus.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry(object):
+    """
+    Thread-safe store for the metrics in METRICS, keyed by their labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.values = {name: {} for name in METRICS}
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self._lock:
+            if labels not in self.values[name]:
+                self.values[name][labels] = Histogram(buckets)
+            self.values[name][labels].observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self.values[name][labels] = \
+                self.values[name].get(labels, 0) + amount
+
+    def render(self):
+        """
+        Returns all of the metrics in the Prometheus text format.
+        """
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text, _) in METRICS.items():
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} {}'.format(name, metric_type))
+                for labels, value in sorted(self.values[name].items()):
+                    if metric_type == 'counter':
+                        lines.append(format_sample(name, labels, value))
+                        continue
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append(format_sample(
+                            name + '_bucket', labels + (('le', bound),),
+                            count))
+                    lines.append(format_sample(
+                        name + '_bucket', labels + (('le', '+Inf'),),
+                        value.count))
+                    lines.append(format_sample(
+                        name + '_sum', labels, value.sum))
+                    lines.append(format_sample(
+                        name + '_count', labels, value.count))
+        return '\n'.join(lines) + '\n'
+
+
+def format_sample(name, labels, value):
+    label_text = ','.join(
+        '{}="{}"'.format(key, str(label).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for key, label in labels)
+    return '{}{{{}}} {}'.format(name, label_text, value)
+
+
+registry = MetricsRegistry()
+
+
+########################################################
+# Serialization timing
+########################################################
+# the profile of the sampled request that each thread is handling
+_local = threading.local()
+
+
+def activate(profile):
+    """
+    Sets (or with None, clears) the profile of the sampled request
+    that the current thread is handling.
+    """
+    _local.profile = profile
+
+
+def active_profile():
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def serializing():
+    """
+    Adds the time spent in the block to the 'serialize_seconds' of the
+    active profile (if any). Nested blocks are only counted once.
+    """
+    profile = active_profile()
+    if profile is None or profile['serializing']:
+        yield
+        return
+    profile['serializing'] = True
+    started = time.time()
+    try:
+        yield
+    finally:
+        profile['serialize_seconds'] += time.time() - started
+        profile['serializing'] = False
+
+
+def timed(function):
+    """
+    Wraps the function so that its calls are timed with serializing().
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with serializing():
+            return function(*args, **kwargs)
+    return wrapper
+
+
+########################################################
+# N+1 detection
+########################################################
+SQL_SHAPE_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+)
+
+
+def sql_shape(sql):
+    """
+    Returns the SQL with its literal values replaced by placeholders,
+    so that queries that differ only by their values match.
+    """
+    for pattern, replacement in SQL_SHAPE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def repeated_shapes(queries, threshold):
+    """
+    Returns (shape, count) for each SQL shape that appears at least
+    'threshold' times in the queries, which usually means that something
+    is being queried once per row (i.e. an N+1 pattern).
+    """
+    counts = Counter(sql_shape(query['sql']) for query in queries)
+    return [(shape, count) for shape, count in counts.most_common()
+            if count >= threshold]
@@ -0,0 +1,57 @@
+"""
+Receivers for the API's signals. These are connected in ApiGamesV1Config.
+"""
+from allauth.account.signals import user_signed_up
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+from .caching import response_cache
+from .models import UserProfile
+from .notifications import broker
+from .signals import owner_data_changed
+from .stats import stats_cache
+from .views_auth import invalidate_existence
+
+
+@receiver(owner_data_changed)
+def invalidate_response_cache(sender, owner, kinds, **kwargs):
+    response_cache.invalidate(owner)
+
+
+@receiver(owner_data_changed)
+def invalidate_stats_cache(sender, owner, kinds, **kwargs):
+    stats_cache.invalidate(owner, kinds)
+
+
+@receiver(owner_data_changed)
+def publish_change_notification(sender, owner, kinds, **kwargs):
+    broker.publish(owner.pk, kinds)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    for key in Token.objects.filter(user=instance)\
+            .values_list('key', flat=True):
+        invalidate_token(key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_existence(sender, instance, **kwargs):
+    invalidate_existence(instance)
+
+
+@receiver(user_signed_up)
+def create_user_profile(sender, request, user, **kwargs):
+    UserProfile.objects.get_or_create(owner=user)
@@ -0,0 +1,112 @@
+"""
+Helpers for seeding large synthetic libraries, for use in tests and
+benchmarks.
+
+Most of our models inherit from the concrete BaseModel, which means
+Django's bulk_create() cannot be used with them. Instead, we allocate
+the primary keys ourselves, bulk insert the BaseModel rows, and then
+insert the child rows directly. This is only safe when nothing else is
+writing to the database at the same time, so it should never be used
+outside of tests and benchmarks.
+"""
+import datetime
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import BaseModel, Game, GameDateRelation, PlatformModel,\
+    Tag, TagGameRelation
+
+BATCH_SIZE = 500
+
+
+def _insert_inherited(model, rows):
+    """
+    Bulk inserts the provided rows (a list of dicts keyed by field attname)
+    for a Model that inherits from BaseModel. Returns the list of new pks.
+    """
+    if not rows:
+        return []
+    now = timezone.now()
+    start = (BaseModel.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+    pks = list(range(start, start + len(rows)))
+    BaseModel.objects.bulk_create(
+        [BaseModel(id=pk, created=now, modified=now) for pk in pks],
+        batch_size=BATCH_SIZE)
+
+    fields = model._meta.local_concrete_fields
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(f.column) for f in fields),
+        ', '.join(['%s'] * len(fields)))
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), BATCH_SIZE):
+            batch = []
+            for pk, row in zip(pks[i:i + BATCH_SIZE], rows[i:i + BATCH_SIZE]):
+                row = dict(row, basemodel_ptr_id=pk)
+                batch.append([
+                    f.get_db_prep_save(row.get(f.attname), connection)
+                    for f in fields])
+            cursor.executemany(sql, batch)
+    return pks
+
+
+def _reset_sequences():
+    """
+    Moves the database sequences past the pks that we allocated manually
+    (only necessary on backends that use sequences, e.g. Postgres).
+    """
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [BaseModel, GameDateRelation])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def seed_library(user, games=0, platforms=0, dates_per_game=0,
+                 tags=0, tags_per_game=0):
+    """
+    Creates a synthetic library for the specified user.
+
+    Platforms and Tags are assigned to Games round-robin, and each Game
+    receives 'dates_per_game' consecutive dates ending today.
+    Returns the list of new Game pks.
+    """
+    with transaction.atomic():
+        platform_ids = _insert_inherited(PlatformModel, [
+            {'owner_id': user.pk, 'title': 'Platform {}'.format(i)}
+            for i in range(platforms)])
+        tag_ids = _insert_inherited(Tag, [
+            {'owner_id': user.pk, 'title': 'Tag {}'.format(i)}
+            for i in range(tags)])
+        game_ids = _insert_inherited(Game, [{
+            'owner_id': user.pk,
+            'title': 'Game {}'.format(i),
+            'platform_id': (platform_ids[i % len(platform_ids)]
+                            if platform_ids else None),
+            'finished': i % 2 == 0,
+        } for i in range(games)])
+
+        if tag_ids and tags_per_game:
+            _insert_inherited(TagGameRelation, [{
+                'owner_id': user.pk,
+                '_tag_id': tag_ids[(i + j) % len(tag_ids)],
+                '_game_id': game_id,
+            } for i, game_id in enumerate(game_ids)
+                for j in range(min(tags_per_game, len(tag_ids)))])
+
+        if dates_per_game:
+            today = datetime.date.today()
+            GameDateRelation.objects.bulk_create([
+                GameDateRelation(
+                    owner_id=user.pk,
+                    game_id=game_id,
+                    date=today - datetime.timedelta(days=d))
+                for game_id in game_ids
+                for d in range(dates_per_game)], batch_size=BATCH_SIZE)
+
+        _reset_sequences()
+    return game_ids
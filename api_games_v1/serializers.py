@@ -1,8 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
-from .models import Game, GameDateRelation, PlatformModel,\
-    Tag, TagGameRelation, UserProfile
+from .models import Game, PlatformModel, Tag, TagGameRelation, UserProfile
 
 # Get the UserModel
 UserModel = get_user_model()
@@ -61,6 +60,29 @@ class TagGameRelationReadSerializer(serializers.ModelSerializer):
         fields = ('id', '_tag')
 
 
+class TagGameRelationBulkSerializer(serializers.Serializer):
+    """
+    Serializer for validating a bulk tagging request. The Games and Tags
+    themselves are looked up by the view, all at once.
+    """
+    ACTIONS = ('add', 'remove')
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    games = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=500)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=50)
+    tag_titles = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        required=False, max_length=50)
+
+    def validate(self, data):
+        if not data.get('tags') and not data.get('tag_titles'):
+            raise serializers.ValidationError(
+                {'tags': ['Either tags or tag_titles is required.']})
+        return data
+
+
 ########################################################
 # Platform Serializers
 ########################################################
@@ -96,15 +118,18 @@ class GameReadSerializer(serializers.ModelSerializer):
         associated dates values
     - Platform instance is populated using PlatformNestedSerializer
         because we want to return full Platform data, rather than just the ID.
+    - Tags list is populated using TagGameRelationReadSerializer,
+        i.e. the same data that is returned when adding a Tag to a Game.
     """
     dates = serializers.StringRelatedField(many=True, read_only=True)
     platform = PlatformNestedSerializer(read_only=True)
+    tags = TagGameRelationReadSerializer(many=True, read_only=True)
 
     class Meta:
         model = Game
         fields = (
             'id', 'title', 'platform',
-            'finished', 'dates',
+            'finished', 'dates', 'tags',
             'created', 'modified')
 
 
@@ -113,8 +138,11 @@ class GameWriteSerializer(serializers.ModelSerializer):
     Basic serializer for creating/editing Game model.
 
     This serializer provides a custom to_representation implementation
-        in order to correctly populate the 'platform' and 'dates' fields
-        for the return value after a write request.
+        in order to correctly populate the 'platform', 'dates' and 'tags'
+        fields for the return value after a write request. These are read
+        from the saved instance itself (i.e. its Platform and its own
+        dates/Tags), so the response costs at most one extra query each
+        for the dates and the Tags.
     """
 
     class Meta:
@@ -124,24 +152,47 @@ class GameWriteSerializer(serializers.ModelSerializer):
             'finished', 'created', 'modified')
 
     def to_representation(self, obj):
-        platform = PlatformModel.objects.get(pk=obj.platform)
-        dates = [str(d) for d in GameDateRelation.objects.filter(
-            owner=obj.owner,
-            game__title=obj.title)]
+        platform = obj.platform
         return {
             'id': obj.id,
             'title': obj.title,
             'platform': {
                 'id': platform.id,
                 'title': platform.title,
-            },
+            } if platform else None,
             'finished': obj.finished,
-            'dates': dates,
+            'dates': [str(d) for d in obj.dates.all()],
+            'tags': TagGameRelationReadSerializer(
+                obj.tags.select_related('_tag'), many=True).data,
             'created': obj.created,
             'modified': obj.modified,
         }
 
 
+class GameBulkItemSerializer(serializers.Serializer):
+    """
+    Serializer for validating a single item in a bulk Games write.
+
+    Items with an 'id' update that (existing) Game; items without one
+    create a new Game, and must include a title. Platforms and existing
+    Games are looked up by the view, all at once, rather than here.
+    """
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=255, required=False)
+    platform = serializers.IntegerField(required=False, allow_null=True)
+    finished = serializers.BooleanField(required=False)
+    dates = serializers.ListField(
+        child=serializers.DateField(), required=False)
+    datesRemoved = serializers.ListField(
+        child=serializers.DateField(), required=False)
+
+    def validate(self, data):
+        if 'id' not in data and not data.get('title'):
+            raise serializers.ValidationError(
+                {'title': ['This field is required.']})
+        return data
+
+
 ########################################################
 # User/Auth Serializers
 ########################################################
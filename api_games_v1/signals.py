@@ -0,0 +1,20 @@
+"""
+Signals sent by the API views when a user's data changes.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+
+# Sent whenever one of the API views writes a user's data, once the
+# current transaction (if any) has been committed.
+# 'kinds' is a frozenset of the types of data that were changed:
+# 'games', 'dates', 'platforms', 'tags' and/or 'profile'
+owner_data_changed = Signal(providing_args=['owner', 'kinds'])
+
+
+def send_data_changed(sender, owner, *kinds):
+    """
+    Sends the owner_data_changed signal, deferred until the current
+    transaction commits (so that receivers never see uncommitted data).
+    """
+    transaction.on_commit(lambda: owner_data_changed.send(
+        sender=sender, owner=owner, kinds=frozenset(kinds)))
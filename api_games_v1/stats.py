@@ -0,0 +1,132 @@
+"""
+Per-user statistics for the dashboard.
+
+Stats are split into buckets, each computed with a single aggregate query
+and cached separately (per user) in the response cache's backend. Each
+bucket lists the kinds of data it depends on (see signals.py), so when a
+user's data changes, only the affected buckets are dropped and recomputed;
+e.g. adding a date to a Game leaves its Platform and Tag counts cached.
+"""
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Count
+
+from .caching import get_version, new_version, response_cache
+from .models import Game, GameDateRelation, TagGameRelation
+
+TOP_TAGS = 10
+
+
+def games_per_platform(owner):
+    rows = Game.objects.filter(owner=owner)\
+        .values('platform', 'platform__title')\
+        .annotate(count=Count('pk'))\
+        .order_by('-count', 'platform__title')
+    return [{
+        'id': row['platform'],
+        'title': row['platform__title'],
+        'count': row['count'],
+    } for row in rows]
+
+
+def finished_counts(owner):
+    counts = dict(Game.objects.filter(owner=owner)
+                  .values('finished')
+                  .annotate(count=Count('pk'))
+                  .values_list('finished', 'count'))
+    return {
+        'finished': counts.get(True, 0),
+        'unfinished': counts.get(False, 0),
+    }
+
+
+def sessions_per_month(owner):
+    # Django 1.9 has no TruncMonth, so the month is selected with the
+    # database's own date truncation (which is what TruncMonth uses).
+    month = connection.ops.date_trunc_sql('month', '{}.{}'.format(
+        connection.ops.quote_name(GameDateRelation._meta.db_table),
+        connection.ops.quote_name('date')))
+    rows = GameDateRelation.objects.filter(owner=owner)\
+        .extra(select={'month': month})\
+        .values('month')\
+        .annotate(count=Count('pk'))\
+        .order_by('month')
+    # truncated dates are returned as dates, datetimes or strings,
+    # depending on the database
+    return [{
+        'month': str(row['month'])[:7],
+        'count': row['count'],
+    } for row in rows]
+
+
+def top_tags(owner):
+    rows = TagGameRelation.objects.filter(owner=owner)\
+        .values('_tag', '_tag__title')\
+        .annotate(count=Count('pk'))\
+        .order_by('-count', '_tag__title')[:TOP_TAGS]
+    return [{
+        'id': row['_tag'],
+        'title': row['_tag__title'],
+        'count': row['count'],
+    } for row in rows]
+
+
+# each bucket's name, the function that computes it,
+# and the kinds of data that it depends on
+BUCKETS = OrderedDict([
+    ('games_per_platform', (games_per_platform, {'games', 'platforms'})),
+    ('finished', (finished_counts, {'games'})),
+    ('sessions_per_month', (sessions_per_month, {'dates'})),
+    ('top_tags', (top_tags, {'tags'})),
+])
+
+
+class StatsCache(object):
+    """
+    Caches each of a user's stats buckets under its own version number,
+    so that they can be invalidated individually.
+
+    As with the ResponseCache, each bucket's version is read before the
+    bucket is computed, so a bucket that is invalidated while it is being
+    computed is stored under its old version, where it is never read.
+    """
+    prefix = 'gameon:stats'
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def version_key(self, owner, bucket):
+        return '{}:version:{}:{}'.format(self.prefix, owner.pk, bucket)
+
+    def make_key(self, owner, bucket):
+        return '{}:{}:{}:{}'.format(
+            self.prefix, owner.pk, bucket,
+            get_version(self.backend, self.version_key(owner, bucket)))
+
+    def get_stats(self, owner):
+        """
+        Returns all of the owner's stats, computing (and caching) only
+        the buckets that are not already cached.
+        """
+        stats = OrderedDict()
+        for bucket, (compute, _) in BUCKETS.items():
+            key = self.make_key(owner, bucket)
+            value = self.backend.get(key)
+            if value is None:
+                value = compute(owner)
+                self.backend.set(key, value)
+            stats[bucket] = value
+        return stats
+
+    def invalidate(self, owner, kinds):
+        """
+        Drops any of the owner's buckets that depend on the changed kinds.
+        """
+        for bucket, (_, depends_on) in BUCKETS.items():
+            if depends_on & kinds:
+                self.backend.incr(
+                    self.version_key(owner, bucket), new_version())
+
+
+stats_cache = StatsCache(response_cache.backend)
@@ -0,0 +1,150 @@
+"""
+Delta sync: a user's rows that have changed since a watermark, along with
+Tombstones for the rows that have been deleted.
+
+Each kind of row is read with one query on its 'modified' column, and the
+Tombstones with one query on (owner, deleted), so a sync costs the same
+number of queries regardless of the library size, and returns only the
+rows that have changed.
+
+Only the object that was deleted gets a Tombstone, not the objects the
+database deletes along with it, so clients should apply the same cascades
+themselves:
+- deleting a Platform deletes its Games
+- deleting a Game deletes its dates and Tag relations
+- deleting a Tag deletes its Tag relations
+"""
+import datetime
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .fast_serializers import DATETIME_FIELD
+from .models import Game, GameDateRelation, PlatformModel, Tag,\
+    TagGameRelation, Tombstone
+
+# the rows returned for each kind, as (model, output key -> field)
+SYNC_KINDS = OrderedDict([
+    ('platforms', (PlatformModel, OrderedDict([
+        ('id', 'id'),
+        ('title', 'title'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+    ]))),
+    ('games', (Game, OrderedDict([
+        ('id', 'id'),
+        ('title', 'title'),
+        ('platform', 'platform_id'),
+        ('finished', 'finished'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+    ]))),
+    ('dates', (GameDateRelation, OrderedDict([
+        ('id', 'id'),
+        ('game', 'game_id'),
+        ('date', 'date'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+    ]))),
+    ('tags', (Tag, OrderedDict([
+        ('id', 'id'),
+        ('title', 'title'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+    ]))),
+    ('tag_relations', (TagGameRelation, OrderedDict([
+        ('id', 'id'),
+        ('game', '_game_id'),
+        ('tag', '_tag_id'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+    ]))),
+])
+
+
+def sync_setting(name, default):
+    return getattr(settings, 'GAMEON_SYNC', {}).get(name, default)
+
+
+def retention_cutoff():
+    """
+    Returns the time before which Tombstones may have been compacted.
+    """
+    return timezone.now() - datetime.timedelta(
+        days=sync_setting('TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def record_deletes(owner, kind, object_ids):
+    """
+    Records a Tombstone for each of the deleted objects, in one query.
+    Should be called in the same transaction as the delete.
+    """
+    Tombstone.objects.bulk_create([
+        Tombstone(owner=owner, kind=kind, object_id=object_id)
+        for object_id in object_ids])
+
+
+def format_value(value):
+    if isinstance(value, datetime.datetime):
+        return DATETIME_FIELD.to_representation(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def changed_rows(owner, kind, since):
+    model, fields = SYNC_KINDS[kind]
+    queryset = model.objects.filter(owner=owner)
+    if since is not None:
+        queryset = queryset.filter(modified__gt=since)
+    rows = queryset\
+        .order_by('modified', 'id')\
+        .values_list(*fields.values())
+    return [OrderedDict(zip(fields, map(format_value, row)))
+            for row in rows]
+
+
+def deleted_ids(owner, since):
+    deleted = OrderedDict((kind, []) for kind in SYNC_KINDS)
+    if since is None:
+        # a full sync has nothing to delete
+        return deleted
+    for kind, object_id in Tombstone.objects\
+            .filter(owner=owner, deleted__gt=since)\
+            .order_by('deleted', 'id')\
+            .values_list('kind', 'object_id'):
+        deleted[kind].append(object_id)
+    return deleted
+
+
+def changes_since(owner, since=None):
+    """
+    Returns all of the user's rows that have changed since the watermark
+    (or all of their rows, if it is None), the ids of those that have been
+    deleted, and a new watermark for the next sync.
+
+    The new watermark is taken before reading anything, and is set back
+    by settings.GAMEON_SYNC['OVERLAP_SECONDS'], so that rows written by
+    transactions which were still in progress are picked up next time.
+    Clients may therefore see some rows more than once.
+    """
+    watermark = timezone.now() - datetime.timedelta(
+        seconds=sync_setting('OVERLAP_SECONDS', 5))
+    changes = OrderedDict([('watermark', format_value(watermark))])
+    for kind in SYNC_KINDS:
+        changes[kind] = changed_rows(owner, kind, since)
+    changes['deleted'] = deleted_ids(owner, since)
+    return changes
+
+
+def compact_tombstones(before=None):
+    """
+    Deletes the Tombstones recorded before the cutoff (by default, the
+    retention period from settings.GAMEON_SYNC). Returns the number
+    of Tombstones that were deleted.
+    """
+    if before is None:
+        before = retention_cutoff()
+    deleted, _ = Tombstone.objects.filter(deleted__lt=before).delete()
+    return deleted
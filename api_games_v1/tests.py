@@ -1,3 +1,1151 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from .authentication import token_cache
+from .caching import LRUCache, response_cache
+from .library import LibraryImporter, LibraryImportError, export_records
+from .models import Game, GameDateRelation, PlatformModel, Tag,\
+    TagGameRelation, Tombstone, UserProfile
+from .notifications import broker
+from .profiling import active_profile, registry, repeated_shapes
+from .seed import seed_library
+from .stats import BUCKETS, stats_cache
+from .views_auth import existence_cache
+
+# set this to run the slower tests against very large libraries
+LARGE_TESTS = bool(os.environ.get('GAMEON_LARGE_TESTS'))
+
+
+class BaseTestMixin(object):
+    """
+    Creates and authenticates a user for each test, and makes sure
+    that nothing is left in the caches from previous tests.
+    """
+
+    def setUp(self):
+        super(BaseTestMixin, self).setUp()
+        response_cache.clear()
+        token_cache.clear()
+        existence_cache.clear()
+        broker.clear()
+        # the default cache holds the throttling history
+        cache.clear()
+        self.user = User.objects.create_user('player', password='password')
+        self.client.force_authenticate(self.user)
+
+
+class BaseTestCase(BaseTestMixin, APITestCase):
+    pass
+
+
+class GameListQueryCountTests(BaseTestCase):
+    """
+    Ensures that listing Games costs the same number of queries per page,
+    regardless of how large the user's library is.
+
+    Expected queries: the three conditional GET validators (Games,
+    Platforms and Tags), page count, page of Games (joined with Platforms),
+    and a single prefetch each for all of the dates and Tags on the page.
+    """
+    url = '/api/v1/games/'
+    queries_per_page = 7
+
+    def assert_constant_queries(self, games):
+        seed_library(self.user, games=games, platforms=5, dates_per_game=3,
+                     tags=5, tags_per_game=2)
+        with self.assertNumQueries(self.queries_per_page):
+            res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['count'], games)
+        for game in res.data['results']:
+            self.assertIsNotNone(game['platform'])
+            self.assertEqual(len(game['dates']), 3)
+            self.assertEqual(len(game['tags']), 2)
+
+    def test_10_games(self):
+        self.assert_constant_queries(10)
+
+    def test_1000_games(self):
+        self.assert_constant_queries(1000)
+
+    @unittest.skipUnless(LARGE_TESTS, 'set GAMEON_LARGE_TESTS to run')
+    def test_100000_games(self):
+        self.assert_constant_queries(100000)
+
+    def test_later_page(self):
+        seed_library(self.user, games=100, platforms=5, dates_per_game=3)
+        with self.assertNumQueries(self.queries_per_page):
+            res = self.client.get(self.url, {'page': 4})
+        self.assertEqual(len(res.data['results']), 20)
+
+
+class GameDateSyncTests(BaseTestCase):
+    """
+    Tests for syncing a Game's added/removed dates on update.
+    """
+
+    def setUp(self):
+        super(GameDateSyncTests, self).setUp()
+        self.game_id = seed_library(
+            self.user, games=1, platforms=1, dates_per_game=10)[0]
+        self.url = '/api/v1/games/{}/'.format(self.game_id)
+
+    def dates(self):
+        return set(str(d) for d in GameDateRelation.objects.filter(
+            game_id=self.game_id).values_list('date', flat=True))
+
+    def test_add_and_remove_dates(self):
+        existing = sorted(self.dates())
+        added = ['2016-01-{:02d}'.format(d) for d in range(1, 29)]
+        res = self.client.patch(self.url, {
+            'dates': added + existing[:2],
+            'datesRemoved': existing[-3:] + ['2001-01-01'],
+        }, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            self.dates(), set(added) | set(existing[:-3]))
+
+    def test_invalid_date(self):
+        for dates in (['not-a-date'], [None], [5], [''], '2016-01-01'):
+            res = self.client.patch(
+                self.url, {'dates': dates}, format='json')
+            self.assertEqual(res.status_code, 400, dates)
+            self.assertIn('dates', res.data)
+        res = self.client.patch(
+            self.url, {'datesRemoved': [None]}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('datesRemoved', res.data)
+
+
+class GameWriteResponseTests(BaseTestCase):
+    """
+    Tests for the response returned after writing a Game.
+    """
+
+    def test_dates_are_scoped_to_the_game(self):
+        first, second = seed_library(self.user, games=2, dates_per_game=2)
+        Game.objects.filter(pk__in=[first, second]).update(title='Same')
+        res = self.client.patch(
+            '/api/v1/games/{}/'.format(first),
+            {'dates': ['2016-01-01']}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data['dates']), 3)
+        self.assertIsNone(res.data['platform'])
+
+    def test_create_without_platform(self):
+        res = self.client.post('/api/v1/games/', {
+            'title': 'New Game',
+            'dates': ['2016-01-01', '2016-01-02'],
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertIsNone(res.data['platform'])
+        self.assertEqual(res.data['dates'], ['2016-01-02', '2016-01-01'])
+
+
+class CursorPaginationTests(BaseTestCase):
+    """
+    Tests for the opt-in cursor pagination mode on list views.
+    """
+
+    def test_walk_all_pages(self):
+        game_ids = seed_library(self.user, games=55, dates_per_game=1)
+        seen = []
+        res = self.client.get('/api/v1/games/', {'paginate': 'cursor'})
+        while True:
+            self.assertNotIn('count', res.data)
+            seen.extend(game['id'] for game in res.data['results'])
+            if not res.data['next']:
+                break
+            # validators, page, dates/Tags prefetches; no COUNT(*) for any page
+            with self.assertNumQueries(6):
+                res = self.client.get(res.data['next'])
+        self.assertEqual(sorted(seen), sorted(game_ids))
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_page_number_by_default(self):
+        seed_library(self.user, platforms=3, tags=3)
+        for url in ('/api/v1/platforms/', '/api/v1/tags/'):
+            res = self.client.get(url)
+            self.assertEqual(res.data['count'], 3)
+
+
+class TagGameRelationCreateTests(BaseTestCase):
+    """
+    Tests for adding a Tag to a Game.
+    """
+    url = '/api/v1/tag-relations/'
+
+    def setUp(self):
+        super(TagGameRelationCreateTests, self).setUp()
+        self.game_id = seed_library(self.user, games=1)[0]
+
+    def test_create_is_idempotent(self):
+        data = {'_game': self.game_id, 'tag_title': 'Co-op'}
+        created = self.client.post(self.url, data, format='json')
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.data['_tag']['title'], 'Co-op')
+
+        data['_tag'] = created.data['_tag']['id']
+        for payload in (data, {'_game': self.game_id, 'tag_title': 'Co-op'}):
+            existing = self.client.post(self.url, payload, format='json')
+            self.assertEqual(existing.status_code, 200)
+            self.assertEqual(existing.data, created.data)
+        self.assertEqual(TagGameRelation.objects.count(), 1)
+
+    def test_query_counts(self):
+        """
+        Before the upsert rewrite, adding a Tag by title took: a relation
+        probe, a Tag get_or_create (get + 2 inserts), the serializer's
+        _tag/_game lookups, the relation inserts (2) and a final Tag fetch;
+        i.e. 9 statements. Re-adding an existing Tag took 2 queries.
+        """
+        data = {'_game': self.game_id, 'tag_title': 'Co-op'}
+        # Game's Tags, Tag lookup, savepoint, Tag inserts (2), release,
+        # savepoint, relation inserts (2), release
+        with self.assertNumQueries(10):
+            created = self.client.post(self.url, data, format='json')
+        # Game's Tags, savepoint, relation inserts (2), release
+        data = {'_game': self.game_id, '_tag': created.data['_tag']['id']}
+        TagGameRelation.objects.all().delete()
+        with self.assertNumQueries(6):
+            self.client.post(self.url, data, format='json')
+        # Game's Tags
+        with self.assertNumQueries(1):
+            existing = self.client.post(self.url, data, format='json')
+        self.assertEqual(existing.status_code, 200)
+
+    def test_invalid_requests(self):
+        other = User.objects.create_user('other', password='password')
+        other_game = seed_library(other, games=1, tags=1)[0]
+        for data in ({'_game': other_game, 'tag_title': 'Mine'},
+                     {'_game': self.game_id},
+                     {'_game': self.game_id, '_tag': 999999},
+                     {'_game': 'abc', 'tag_title': 'Mine'}):
+            res = self.client.post(self.url, data, format='json')
+            self.assertEqual(res.status_code, 400)
+
+
+class ConditionalGetTests(BaseTestCase):
+    """
+    Tests for answering conditional GET requests with a 304.
+    """
+
+    def setUp(self):
+        super(ConditionalGetTests, self).setUp()
+        self.game_ids = seed_library(
+            self.user, games=5, platforms=2, dates_per_game=1)
+
+    def test_list_etag(self):
+        url = '/api/v1/games/'
+        res = self.client.get(url)
+        etag = res['ETag']
+        # only the three validator queries; nothing is serialized
+        with self.assertNumQueries(3):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        # other pages and other users get their own ETags
+        self.assertNotEqual(
+            self.client.get(url, {'page': 1})['ETag'], etag)
+        other = User.objects.create_user('other', password='password')
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_authenticate(self.user)
+
+        self.client.delete('/api/v1/games/{}/'.format(self.game_ids[-1]))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_detail_last_modified(self):
+        url = '/api/v1/platforms/{}/'.format(
+            Game.objects.get(pk=self.game_ids[0]).platform_id)
+        res = self.client.get(url)
+        last_modified = res['Last-Modified']
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(
+            self.client.get('/api/v1/platforms/999999/').status_code, 404)
+
+
+class ResponseCacheTests(BaseTestMixin, APITransactionTestCase):
+    """
+    Tests for the per-user Game list cache. These need real commits,
+    since the cache is only invalidated once a write has been committed.
+    """
+    url = '/api/v1/games/'
+
+    def setUp(self):
+        super(ResponseCacheTests, self).setUp()
+        self.game_ids = seed_library(self.user, games=3, dates_per_game=1)
+
+    def test_cached_until_write(self):
+        first = self.client.get(self.url)
+        # only the conditional GET validators
+        with self.assertNumQueries(3):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.data, first.data)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+
+        self.client.patch('/api/v1/games/{}/'.format(self.game_ids[0]),
+                          {'title': 'Renamed'}, format='json')
+        res = self.client.get(self.url)
+        self.assertIn('Renamed', [g['title'] for g in res.data['results']])
+
+    def test_cache_is_per_user(self):
+        self.client.get(self.url)
+        other = User.objects.create_user('other', password='password')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).data['count'], 0)
+
+    def test_write_not_seen_by_this_process(self):
+        etag = self.client.get(self.url)['ETag']
+        # saved without sending owner_data_changed, as if another
+        # process had handled the write
+        game = Game.objects.get(pk=self.game_ids[0])
+        game.title = 'Renamed'
+        game.save()
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Renamed', [g['title'] for g in res.data['results']])
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+    def test_invalidated_while_building(self):
+        def build():
+            response_cache.invalidate(self.user)
+            return 'stale'
+        response_cache.get_or_set(self.user, 'key', build)
+        self.assertEqual(
+            response_cache.get_or_set(self.user, 'key', lambda: 'fresh'),
+            'fresh')
+
+
+class LRUCacheTests(TestCase):
+    """
+    Tests for the in-process LRU cache.
+    """
+
+    def test_eviction(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+class GameBulkTests(BaseTestCase):
+    """
+    Tests for creating/updating many Games in one request.
+    """
+    url = '/api/v1/games/bulk/'
+
+    def setUp(self):
+        super(GameBulkTests, self).setUp()
+        self.game_id = seed_library(
+            self.user, games=1, platforms=1, dates_per_game=2)[0]
+        self.platform_id = Game.objects.get(pk=self.game_id).platform_id
+
+    def test_create_and_update(self):
+        existing = sorted(str(d) for d in GameDateRelation.objects.filter(
+            game_id=self.game_id).values_list('date', flat=True))
+        items = [{
+            'title': 'New Game {}'.format(i),
+            'platform': self.platform_id,
+            'dates': ['2016-01-01', '2016-01-02'],
+        } for i in range(20)]
+        items.append({
+            'id': self.game_id,
+            'finished': True,
+            'dates': ['2016-02-01'],
+            'datesRemoved': existing[:1],
+        })
+        res = self.client.post(self.url, items, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [r['status'] for r in res.data], ['created'] * 20 + ['updated'])
+        self.assertEqual(res.data[0]['game']['platform']['id'],
+                         self.platform_id)
+        updated = res.data[-1]['game']
+        self.assertTrue(updated['finished'])
+        self.assertEqual(updated['dates'], [existing[1], '2016-02-01'])
+        self.assertEqual(Game.objects.filter(owner=self.user).count(), 21)
+        self.assertEqual(GameDateRelation.objects.count(), 42)
+
+    def test_invalid_items_write_nothing(self):
+        other = User.objects.create_user('other', password='password')
+        other_game = seed_library(other, games=1)[0]
+        res = self.client.post(self.url, [
+            {'title': 'Fine'},
+            {'platform': self.platform_id},
+            {'id': other_game, 'title': 'Mine now'},
+            {'title': 'Bad date', 'dates': ['nope']},
+        ], format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([r['status'] for r in res.data],
+                         ['ok', 'invalid', 'invalid', 'invalid'])
+        self.assertEqual(Game.objects.filter(owner=self.user).count(), 1)
+
+
+class LibraryExportTests(BaseTestCase):
+    """
+    Tests for streaming a user's library export.
+    """
+
+    def setUp(self):
+        super(LibraryExportTests, self).setUp()
+        seed_library(self.user, games=25, platforms=2, dates_per_game=2,
+                     tags=3, tags_per_game=2)
+
+    def test_ndjson(self):
+        res = self.client.get('/api/v1/library/export/ndjson/')
+        self.assertEqual(res.status_code, 200)
+        records = [json.loads(line.decode('utf-8'))
+                   for line in b''.join(res.streaming_content).splitlines()]
+        types = [r['type'] for r in records]
+        self.assertEqual(types, ['platform'] * 2 + ['tag'] * 3 +
+                         ['game'] * 25 + ['game_tag'] * 50 + ['date'] * 50)
+
+    def test_csv(self):
+        res = self.client.get('/api/v1/library/export/csv/')
+        content = b''.join(res.streaming_content).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 130)
+        self.assertEqual(rows[5]['type'], 'game')
+
+    def test_chunked_reads(self):
+        # one query per chunk of each record type (the last chunk of each
+        # type being the first one with fewer than 5 rows)
+        with self.assertNumQueries(1 + 1 + 6 + 11 + 11):
+            records = list(export_records(self.user, chunk_size=5))
+        self.assertEqual(len(records), 130)
+
+
+class LibraryImportTests(BaseTestCase):
+    """
+    Tests for importing a library export.
+    """
+
+    def setUp(self):
+        super(LibraryImportTests, self).setUp()
+        seed_library(self.user, games=12, platforms=2, dates_per_game=2,
+                     tags=3, tags_per_game=2)
+        self.other = User.objects.create_user('other', password='password')
+        seed_library(self.other, platforms=1)
+
+    def export(self, export_format):
+        res = self.client.get(
+            '/api/v1/library/export/{}/'.format(export_format))
+        return b''.join(res.streaming_content)
+
+    def assert_imported(self):
+        # 'Platform 0' already existed for the other user
+        self.assertEqual(
+            PlatformModel.objects.filter(owner=self.other).count(), 2)
+        self.assertEqual(Game.objects.filter(owner=self.other).count(), 12)
+        self.assertEqual(
+            GameDateRelation.objects.filter(owner=self.other).count(), 24)
+        self.assertEqual(
+            TagGameRelation.objects.filter(owner=self.other).count(), 24)
+
+    def test_import_endpoint(self):
+        # the Platforms/Tags from the first import are reused by the second
+        for import_format, created in (('ndjson', 1), ('csv', 0)):
+            upload = io.BytesIO(self.export(import_format))
+            upload.name = 'library.' + import_format
+            self.client.force_authenticate(self.other)
+            res = self.client.post(
+                '/api/v1/library/import/{}/'.format(import_format),
+                {'file': upload}, format='multipart')
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data['rows'], 2 + 3 + 12 + 24 + 24)
+            self.assertEqual(res.data['created']['platform'], created)
+            self.assert_imported()
+            Game.objects.filter(owner=self.other).delete()
+            self.client.force_authenticate(self.user)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as f:
+            f.write(self.export('ndjson'))
+            f.flush()
+            out = io.StringIO()
+            call_command('import_library', 'other', f.name,
+                         chunk_size=5, stdout=out)
+        self.assertIn('Loaded 65 records', out.getvalue())
+        self.assert_imported()
+
+    def test_bad_record(self):
+        importer = LibraryImporter(self.other)
+        with self.assertRaises(LibraryImportError):
+            importer.run(enumerate([
+                {'type': 'game', 'id': 1, 'title': 'Game'},
+                {'type': 'date', 'game': 2, 'date': '2016-01-01'}], 1))
+        self.assertEqual(importer.stats()['read']['game'], 1)
+
+    def test_bad_upload(self):
+        self.client.force_authenticate(self.other)
+        for content, message in (
+                (b'{"type": "tag", "id": 1, "title": "Tag"}\n\n[1, 2]\n',
+                 'Line 3: Expected a JSON object.'),
+                (b'{"type": "tag", "id": 1, "title": "\xff"}\n',
+                 'Line 1: Invalid UTF-8.'),
+                (b'\n{"type": "unknown"}\n', 'Line 2: Unknown type.')):
+            upload = io.BytesIO(content)
+            upload.name = 'library.ndjson'
+            res = self.client.post('/api/v1/library/import/ndjson/',
+                                   {'file': upload}, format='multipart')
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(res.data['detail'], message)
+
+    def test_imported_dates_change_the_etag(self):
+        importer = LibraryImporter(self.other)
+        importer.run([(1, {'type': 'game', 'id': 1, 'title': 'Game'})])
+        self.client.force_authenticate(self.other)
+        etag = self.client.get('/api/v1/games/')['ETag']
+
+        importer.run(
+            [(1, {'type': 'date', 'game': 1, 'date': '2016-01-01'})])
+        res = self.client.get('/api/v1/games/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['results'][0]['dates'], ['2016-01-01'])
+
+
+class TagGameRelationBulkTests(BaseTestCase):
+    """
+    Tests for adding/removing Tags across many Games at once.
+    """
+    url = '/api/v1/tag-relations/bulk/'
+
+    def setUp(self):
+        super(TagGameRelationBulkTests, self).setUp()
+        self.game_ids = seed_library(
+            self.user, games=10, tags=2, tags_per_game=1)
+        self.tag_ids = list(Tag.objects.filter(
+            owner=self.user).values_list('pk', flat=True))
+
+    def test_add_and_remove(self):
+        res = self.client.post(self.url, {
+            'action': 'add',
+            'games': self.game_ids,
+            'tags': self.tag_ids,
+            'tag_titles': ['New Tag'],
+        }, format='json')
+        self.assertEqual(res.status_code, 200)
+        # every Game already had one of the two existing Tags
+        self.assertEqual(len(res.data['added']), 10 + 10)
+        self.assertEqual(TagGameRelation.objects.count(), 30)
+
+        res = self.client.post(self.url, {
+            'action': 'remove',
+            'games': self.game_ids[:5],
+            'tag_titles': ['New Tag', 'Unknown Tag'],
+        }, format='json')
+        self.assertEqual(len(res.data['removed']), 5)
+        self.assertEqual(TagGameRelation.objects.count(), 25)
+
+    def test_unknown_games(self):
+        other = User.objects.create_user('other', password='password')
+        other_game = seed_library(other, games=1)[0]
+        res = self.client.post(self.url, {
+            'action': 'add',
+            'games': self.game_ids + [other_game],
+            'tags': self.tag_ids,
+        }, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(TagGameRelation.objects.count(), 10)
+
+
+class GameTagFilterTests(BaseTestCase):
+    """
+    Tests for the Tags embedded in Games, and filtering Games by Tag.
+    """
+    url = '/api/v1/games/'
+
+    def setUp(self):
+        super(GameTagFilterTests, self).setUp()
+        self.game_ids = seed_library(self.user, games=3)
+        self.tags = [Tag.objects.create(owner=self.user, title=title)
+                     for title in ('RPG', 'Co-op')]
+        # first Game has both Tags, second has only the first
+        for game_id, tag in ((self.game_ids[0], self.tags[0]),
+                             (self.game_ids[0], self.tags[1]),
+                             (self.game_ids[1], self.tags[0])):
+            TagGameRelation.objects.create(
+                owner=self.user, _game_id=game_id, _tag=tag)
+
+    def filtered_ids(self, query):
+        res = self.client.get(self.url + query)
+        self.assertEqual(res.status_code, 200)
+        return sorted(game['id'] for game in res.data['results'])
+
+    def test_tags_in_payload(self):
+        res = self.client.get('{}{}'.format(self.url, self.game_ids[0]))
+        self.assertEqual([tag['_tag']['title'] for tag in res.data['tags']],
+                         ['RPG', 'Co-op'])
+
+    def test_filter_any_and_all(self):
+        tag_ids = '{},{}'.format(self.tags[0].pk, self.tags[1].pk)
+        self.assertEqual(self.filtered_ids('?tags=' + tag_ids),
+                         sorted(self.game_ids[:2]))
+        self.assertEqual(
+            self.filtered_ids('?tags={}&tags_match=all'.format(tag_ids)),
+            self.game_ids[:1])
+        res = self.client.get(self.url + '?tags=rpg')
+        self.assertEqual(res.status_code, 400)
+
+
+class GameFilterTests(BaseTestCase):
+    """
+    Tests for filtering, sorting and searching the Game list.
+    """
+    url = '/api/v1/games/'
+
+    def setUp(self):
+        super(GameFilterTests, self).setUp()
+        self.platform = PlatformModel.objects.create(
+            owner=self.user, title='SNES')
+        self.games = {}
+        for title, platform, finished, date in (
+                ('Super Metroid', self.platform, True, '2016-01-10'),
+                ('Metroid Prime', None, False, '2016-03-01'),
+                ('Chrono Trigger', self.platform, False, None)):
+            game = Game.objects.create(owner=self.user, title=title,
+                                       platform=platform, finished=finished)
+            if date:
+                GameDateRelation.objects.create(
+                    owner=self.user, game=game, date=date)
+            self.games[title] = game.pk
+
+    def titles(self, query):
+        res = self.client.get(self.url + query)
+        self.assertEqual(res.status_code, 200)
+        return [game['title'] for game in res.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(
+            sorted(self.titles('?platform={}'.format(self.platform.pk))),
+            ['Chrono Trigger', 'Super Metroid'])
+        self.assertEqual(self.titles('?platform=none'), ['Metroid Prime'])
+        self.assertEqual(self.titles('?finished=true'), ['Super Metroid'])
+        self.assertEqual(
+            self.titles('?played_after=2016-01-01&played_before=2016-02-01'),
+            ['Super Metroid'])
+        self.assertEqual(self.titles('?title=metroid'), ['Metroid Prime'])
+        self.assertEqual(self.titles('?search=METROID&sort=title'),
+                         ['Metroid Prime', 'Super Metroid'])
+
+    def test_sort(self):
+        self.assertEqual(self.titles('?sort=-title'), [
+            'Super Metroid', 'Metroid Prime', 'Chrono Trigger'])
+        self.assertEqual(self.titles('?sort=title&paginate=cursor'), [
+            'Chrono Trigger', 'Metroid Prime', 'Super Metroid'])
+
+    def test_invalid_params(self):
+        for query in ('?sort=platform', '?finished=maybe',
+                      '?played_after=yesterday', '?platform=snes'):
+            res = self.client.get(self.url + query)
+            self.assertEqual(res.status_code, 400, query)
+
+
+class StatsTests(BaseTestMixin, APITransactionTestCase):
+    """
+    Tests for the stats endpoint and its per-bucket caching.
+    """
+    url = '/api/v1/stats/'
+
+    def setUp(self):
+        super(StatsTests, self).setUp()
+        self.game_ids = seed_library(
+            self.user, games=4, platforms=2, tags=3, tags_per_game=2)
+        for game_id, date in ((self.game_ids[0], '2016-01-05'),
+                              (self.game_ids[0], '2016-01-20'),
+                              (self.game_ids[1], '2016-02-01')):
+            GameDateRelation.objects.create(
+                owner=self.user, game_id=game_id, date=date)
+        Game.objects.filter(owner=self.user).update(finished=False)
+        Game.objects.filter(pk=self.game_ids[0]).update(finished=True)
+
+    def test_stats(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            sum(p['count'] for p in res.data['games_per_platform']), 4)
+        self.assertEqual(res.data['finished'],
+                         {'finished': 1, 'unfinished': 3})
+        self.assertEqual(res.data['sessions_per_month'], [
+            {'month': '2016-01', 'count': 2},
+            {'month': '2016-02', 'count': 1}])
+        self.assertEqual(sum(t['count'] for t in res.data['top_tags']), 8)
+
+    def test_only_affected_buckets_are_recomputed(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        self.client.patch('/api/v1/games/{}/'.format(self.game_ids[1]), {
+            'dates': ['2016-02-02'],
+        }, format='json')
+        # a date change saves the Game too, so everything but the Tags
+        with self.assertNumQueries(3):
+            res = self.client.get(self.url)
+        self.assertEqual(res.data['sessions_per_month'][1]['count'], 2)
+
+        self.client.post('/api/v1/tag-relations/', {
+            '_game': self.game_ids[2], 'tag_title': 'New Tag',
+        }, format='json')
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url)
+        self.assertIn('New Tag', [t['title'] for t in res.data['top_tags']])
+
+    def test_invalidated_while_computing(self):
+        compute, depends_on = BUCKETS['finished']
+
+        def racing(owner):
+            stats_cache.invalidate(owner, {'games'})
+            return 'stale'
+        with mock.patch.dict(BUCKETS, {'finished': (racing, depends_on)}):
+            stats_cache.get_stats(self.user)
+        self.assertEqual(stats_cache.get_stats(self.user)['finished'],
+                         {'finished': 1, 'unfinished': 3})
+
+
+class CachedTokenAuthenticationTests(BaseTestCase):
+    """
+    Tests for the cached token authentication.
+    """
+    url = '/api/v1/stats/'
+
+    def setUp(self):
+        super(CachedTokenAuthenticationTests, self).setUp()
+        self.client.force_authenticate(None)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+
+    def test_cache_hit_needs_no_queries(self):
+        self.client.get(self.url)
+        # the stats are cached as well, so the whole request is free
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+
+    def test_logout_invalidates_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.post('/rest-auth/logout/')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivated_user(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class ApiFastPathTests(BaseTestCase):
+    """
+    Tests for skipping the browser-only middleware for API token requests.
+    """
+
+    def setUp(self):
+        super(ApiFastPathTests, self).setUp()
+        self.client.force_authenticate(None)
+        self.token = Token.objects.create(user=self.user)
+
+    def test_token_requests_skip_browser_middleware(self):
+        res = self.client.get(
+            '/api/v1/platforms/',
+            HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+        self.assertNotIn('X-Frame-Options', res)
+
+    def test_other_requests_use_full_stack(self):
+        res = self.client.get('/admin/login/')
+        self.assertTrue(hasattr(res.wsgi_request, 'session'))
+        self.assertIn('X-Frame-Options', res)
+
+
+@override_settings(GAMEON_PROFILING={
+    'SAMPLE_RATE': 1, 'N_PLUS_ONE_THRESHOLD': 3})
+class ProfilingTests(BaseTestCase):
+    """
+    Tests for the profiling middleware and the metrics endpoint.
+    """
+    url = '/api/v1/metrics/'
+
+    def setUp(self):
+        super(ProfilingTests, self).setUp()
+        registry.clear()
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def test_metrics(self):
+        seed_library(self.user, games=3, dates_per_game=1)
+        self.client.get('/api/v1/games/')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(
+            'gameon_request_queries_count{route="api_v1:'
+            'api_games_v1.views_games.GameList",method="GET"} 1',
+            res.content.decode('utf-8'))
+
+    def test_serialize_duration(self):
+        seed_library(self.user, games=3, dates_per_game=1)
+        labels = (('route', 'api_v1:api_games_v1.views_games.GameList'),
+                  ('method', 'GET'))
+        for fast in (True, False):
+            registry.clear()
+            response_cache.clear()
+            with override_settings(GAMEON_FAST_READS=fast):
+                self.client.get('/api/v1/games/')
+            histogram = registry.values[
+                'gameon_request_serialize_duration_seconds'][labels]
+            self.assertEqual(histogram.count, 1)
+            self.assertGreater(histogram.sum, 0)
+        self.assertIsNone(active_profile())
+
+    def test_repeated_shapes(self):
+        queries = [{'sql': 'SELECT * FROM game WHERE id = {}'.format(i)}
+                   for i in range(3)]
+        queries.append({'sql': "SELECT * FROM tag WHERE title = 'a'"})
+        self.assertEqual(repeated_shapes(queries, 3),
+                         [('SELECT * FROM game WHERE id = ?', 3)])
+
+
+class BenchmarkCommandTests(TestCase):
+    """
+    Smoke test for the API benchmark command, with a tiny library.
+    """
+
+    def test_every_route_succeeds(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('benchmark_api', games=3, platforms=1, tags=2,
+                         requests=1, output=output.name, stderr=io.StringIO())
+            results = json.load(io.open(output.name))
+        self.assertEqual(results['meta']['library']['games'], 3)
+        for name, result in results['routes'].items():
+            self.assertLess(result['status'], 400, name)
+            self.assertGreater(result['queries'], 0, name)
+
+
+class FastReadParityTests(BaseTestCase):
+    """
+    Tests that the fast read path renders exactly the same JSON
+    as the serializers.
+    """
+    paths = (
+        '/api/v1/games/',
+        '/api/v1/games/?paginate=cursor&sort=title',
+        '/api/v1/games/?tags={tag}&finished=false',
+        '/api/v1/games/{game}/',
+        '/api/v1/games/{untagged}/',
+        '/api/v1/platforms/',
+        '/api/v1/platforms/{platform}/',
+        '/api/v1/tags/',
+        '/api/v1/tags/?paginate=cursor',
+    )
+
+    def setUp(self):
+        super(FastReadParityTests, self).setUp()
+        game_ids = seed_library(self.user, games=30, platforms=3,
+                                dates_per_game=2, tags=4, tags_per_game=2)
+        untagged = Game.objects.create(owner=self.user, title='No Platform')
+        self.ids = {
+            'game': game_ids[0],
+            'untagged': untagged.pk,
+            'platform': Game.objects.get(pk=game_ids[0]).platform_id,
+            'tag': Tag.objects.filter(owner=self.user).first().pk,
+        }
+
+    def get(self, path, fast):
+        response_cache.clear()
+        with override_settings(GAMEON_FAST_READS=fast):
+            res = self.client.get(path.format(**self.ids), format='json')
+        self.assertEqual(res.status_code, 200, path)
+        return res.content
+
+    def test_parity(self):
+        for path in self.paths:
+            self.assertEqual(self.get(path, True), self.get(path, False), path)
+
+    def test_missing_game(self):
+        res = self.client.get('/api/v1/games/0/')
+        self.assertEqual(res.status_code, 404)
+
+
+class ExistsCheckTests(BaseTestCase):
+    """
+    Tests for the signup form's username/email checks.
+    """
+
+    def setUp(self):
+        super(ExistsCheckTests, self).setUp()
+        self.client.force_authenticate(None)
+        self.user.email = 'Player@Example.com'
+        self.user.save()
+
+    def check(self, check, value):
+        field = 'username' if check == 'user' else check
+        url = '/rest-auth/registration/{}check/'.format(check)
+        return self.client.post(url, {field: value}, format='json').data
+
+    def test_checks(self):
+        self.assertEqual(self.check('email', 'player@example.COM'),
+                         {'email': 'player@example.COM'})
+        self.assertEqual(self.check('user', 'player'), {'user': 'player'})
+        self.assertEqual(self.check('user', 'nobody'), {})
+        self.assertEqual(self.check('email', ''), {})
+
+    def test_cached_until_signup(self):
+        self.assertEqual(self.check('email', 'new@example.com'), {})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check('email', 'new@example.com'), {})
+        User.objects.create_user('new', 'new@example.com', 'password')
+        self.assertEqual(self.check('email', 'new@example.com'),
+                         {'email': 'new@example.com'})
+
+    def test_throttled(self):
+        statuses = {self.client.post(
+            '/rest-auth/registration/usercheck/', {'username': 'player'},
+            format='json').status_code for _ in range(61)}
+        self.assertEqual(statuses, {200, 429})
+
+
+class UserProfileTests(BaseTestMixin, APITransactionTestCase):
+    """
+    Tests for creating Profiles at signup, and reading/updating them.
+    """
+    url = '/rest-auth/user/profile/'
+
+    def test_created_at_signup(self):
+        self.client.force_authenticate(None)
+        res = self.client.post('/rest-auth/registration/', {
+            'username': 'newplayer',
+            'email': 'newplayer@example.com',
+            'password1': 'a-long-password',
+            'password2': 'a-long-password',
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        user = User.objects.get(username='newplayer')
+        self.assertEqual(UserProfile.objects.filter(owner=user).count(), 1)
+
+    def test_cached_until_update(self):
+        UserProfile.objects.create(owner=self.user, first_name='Old')
+        # a single select on the owner
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url)
+        self.assertEqual(res.data['first_name'], 'Old')
+
+        self.client.patch(self.url, {'first_name': 'New'}, format='json')
+        self.assertEqual(self.client.get(self.url).data['first_name'], 'New')
+        self.assertEqual(UserProfile.objects.count(), 1)
+
+    def test_created_on_first_read(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(
+            UserProfile.objects.filter(owner=self.user).count(), 1)
+
+
+class BootstrapTests(BaseTestMixin, APITransactionTestCase):
+    """
+    Tests that the bootstrap endpoint matches the individual endpoints,
+    in a fixed number of queries.
+    """
+    url = '/api/v1/bootstrap/'
+
+    def setUp(self):
+        super(BootstrapTests, self).setUp()
+        seed_library(self.user, games=30, platforms=3, dates_per_game=2,
+                     tags=4, tags_per_game=2)
+        UserProfile.objects.create(owner=self.user, first_name='Player')
+
+    def test_matches_endpoints(self):
+        for fast in (True, False):
+            response_cache.clear()
+            with override_settings(GAMEON_FAST_READS=fast):
+                res = self.client.get(self.url)
+                expected = {
+                    'user': '/rest-auth/user/',
+                    'profile': '/rest-auth/user/profile/',
+                    'platforms': '/api/v1/platforms/?paginate=cursor',
+                    'tags': '/api/v1/tags/?paginate=cursor',
+                    'games': '/api/v1/games/?paginate=cursor',
+                }
+                for key, path in expected.items():
+                    data = self.client.get(path).data
+                    if key in ('platforms', 'tags'):
+                        data = data['results']
+                    if key == 'games':
+                        self.assertEqual(res.data[key]['results'],
+                                         data['results'])
+                    else:
+                        self.assertEqual(res.data[key], data, key)
+
+        # the next page is read from the games endpoint
+        next_page = self.client.get(res.data['games']['next'])
+        self.assertEqual(next_page.status_code, 200)
+        self.assertEqual(len(next_page.data['results']), 10)
+
+    def test_queries(self):
+        with self.assertNumQueries(6):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        self.client.post('/api/v1/tags/', {'title': 'New'}, format='json')
+        res = self.client.get(self.url)
+        self.assertEqual(len(res.data['tags']), 5)
+
+    def test_next_link_per_host(self):
+        for host, secure in (('a.example.com', False),
+                             ('b.example.com', False),
+                             ('b.example.com', True)):
+            res = self.client.get(self.url, HTTP_HOST=host, secure=secure)
+            self.assertTrue(res.data['games']['next'].startswith(
+                '{}://{}/api/v1/games/'.format(
+                    'https' if secure else 'http', host)))
+
+
+@override_settings(GAMEON_SYNC={'OVERLAP_SECONDS': 0})
+class SyncTests(BaseTestCase):
+    """
+    Tests for the delta sync endpoint and its Tombstones.
+    """
+    url = '/api/v1/sync/'
+
+    def setUp(self):
+        super(SyncTests, self).setUp()
+        self.game_ids = seed_library(self.user, games=5, platforms=2,
+                                     dates_per_game=2, tags=3,
+                                     tags_per_game=2)
+
+    def sync(self, since=None):
+        res = self.client.get(self.url, {'since': since} if since else {})
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_changes_since(self):
+        full = self.sync()
+        self.assertEqual(len(full['games']), 5)
+        self.assertEqual(len(full['dates']), 10)
+        self.assertEqual(len(full['tag_relations']), 10)
+        self.assertEqual(self.sync(full['watermark'])['games'], [])
+
+        game = Game.objects.get(pk=self.game_ids[0])
+        date = str(game.dates.first().date)
+        relation = game.tags.first()
+        self.client.patch('/api/v1/games/{}/'.format(game.pk), {
+            'title': 'Renamed', 'datesRemoved': [date]}, format='json')
+        self.client.delete('/api/v1/games/{}/'.format(self.game_ids[1]))
+        self.client.delete('/api/v1/tag-relations/delete/', {
+            'game_id': game.pk, 'tag_id': relation._tag_id}, format='json')
+
+        changes = self.sync(full['watermark'])
+        self.assertEqual([row['title'] for row in changes['games']],
+                         ['Renamed'])
+        self.assertEqual(changes['deleted']['games'], [self.game_ids[1]])
+        self.assertEqual(len(changes['deleted']['dates']), 1)
+        self.assertEqual(changes['deleted']['tag_relations'], [relation.pk])
+        self.assertEqual(changes['platforms'], [])
+
+    def test_queries(self):
+        # one query for each kind of row, and one for the Tombstones
+        watermark = self.sync()['watermark']
+        with self.assertNumQueries(6):
+            self.sync(watermark)
+
+    def test_expired_watermark(self):
+        res = self.client.get(self.url, {'since': '2000-01-01T00:00:00Z'})
+        self.assertEqual(res.status_code, 410)
+
+    def test_compact_tombstones(self):
+        self.client.delete('/api/v1/games/{}/'.format(self.game_ids[0]))
+        self.client.delete('/api/v1/games/{}/'.format(self.game_ids[1]))
+        Tombstone.objects.filter(object_id=self.game_ids[0]).update(
+            deleted=timezone.now() - datetime.timedelta(days=60))
+        call_command('compact_tombstones', stdout=io.StringIO())
+        self.assertEqual(
+            list(Tombstone.objects.values_list('object_id', flat=True)),
+            [self.game_ids[1]])
+
+
+class ChangeNotificationTests(BaseTestMixin, APITransactionTestCase):
+    """
+    Tests for long-polling for changes.
+    """
+    url = '/api/v1/changes/'
+
+    def setUp(self):
+        super(ChangeNotificationTests, self).setUp()
+        self.sequence = self.client.get(self.url).data['sequence']
+
+    def wait(self, after, timeout=0):
+        res = self.client.get(self.url, {'after': after, 'timeout': timeout})
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_changes(self):
+        self.assertEqual(self.wait(self.sequence),
+                         {'sequence': self.sequence, 'kinds': []})
+        self.client.post('/api/v1/platforms/', {'title': 'New'})
+        self.client.post('/api/v1/tags/', {'title': 'New'})
+        self.assertEqual(self.wait(self.sequence), {
+            'sequence': self.sequence + 2, 'kinds': ['platforms', 'tags']})
+        # a sequence from another process resets the client to this one's
+        self.assertEqual(self.wait(self.sequence + 10),
+                         {'sequence': self.sequence + 2, 'kinds': []})
+
+    def test_dropped_history(self):
+        for _ in range(60):
+            broker.publish(self.user.pk, ['games'])
+        self.assertEqual(self.wait(self.sequence),
+                         {'sequence': self.sequence + 60, 'kinds': None})
+
+    def test_waiter_limit(self):
+        broker.publish(self.user.pk, ['games'])
+        with override_settings(GAMEON_NOTIFICATIONS={'MAX_WAITERS': 0}):
+            res = self.client.get(
+                self.url, {'after': self.sequence + 1, 'timeout': 5})
+        self.assertEqual(res['Retry-After'], '5')
+        self.assertEqual(res.data,
+                         {'sequence': self.sequence + 1, 'kinds': []})
+
+    def test_wakes_on_change(self):
+        timer = threading.Timer(
+            0.1, broker.publish, [self.user.pk, ['games']])
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.wait(self.sequence, timeout=5)['kinds'],
+                         ['games'])
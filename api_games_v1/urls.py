@@ -1,12 +1,34 @@
 from django.conf.urls import url
 
-from . import views_games, views_platforms, views_tags
+from . import views_bootstrap, views_games, views_library, views_metrics,\
+    views_notifications, views_platforms, views_stats, views_sync, views_tags
 
 urlpatterns = [
+    url(r'^bootstrap/?$', views_bootstrap.BootstrapView.as_view()),
+
     url(r'^games/?$', views_games.GameList.as_view()),
+    url(r'^games/bulk/?$', views_games.GameBulkView.as_view()),
     url(r'^games/(?P<pk>[0-9]+)/?$', views_games.GameDetail.as_view()),
 
     url(r'^platforms/?$', views_platforms.PlatformList.as_view()),
     url(r'^platforms/(?P<pk>[0-9]+)/?$',
-        views_platforms.PlatformDetail.as_view())
+        views_platforms.PlatformDetail.as_view()),
+
+    url(r'^tags/?$', views_tags.TagList.as_view()),
+    url(r'^tags/delete/(?P<pk>[0-9]+)/?$', views_tags.TagDeleteView.as_view()),
+    url(r'^tag-relations/?$', views_tags.TagGameRelationCreateView.as_view()),
+    url(r'^tag-relations/delete/?$',
+        views_tags.TagGameRelationDeleteView.as_view()),
+    url(r'^tag-relations/bulk/?$',
+        views_tags.TagGameRelationBulkView.as_view()),
+
+    url(r'^library/export/(?P<export_format>ndjson|csv)/?$',
+        views_library.LibraryExportView.as_view()),
+    url(r'^library/import/(?P<import_format>ndjson|csv)/?$',
+        views_library.LibraryImportView.as_view()),
+
+    url(r'^sync/?$', views_sync.SyncView.as_view()),
+    url(r'^changes/?$', views_notifications.ChangesView.as_view()),
+    url(r'^stats/?$', views_stats.StatsView.as_view()),
+    url(r'^metrics/?$', views_metrics.MetricsView.as_view()),
 ]
@@ -2,56 +2,124 @@ from django.contrib.auth.models import User
 
 from rest_framework import generics, permissions
 from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.views import APIView
 
+from .caching import load_backend, response_cache
 from .models import UserProfile
 from .serializers import UserDetailsSerializer, UserProfileSerializer
+from .signals import send_data_changed
 
+# short-lived cache of existence checks (both positive and negative)
+# for the signup form, which checks on every keystroke
+existence_cache = load_backend('GAMEON_EXISTENCE_CACHE')
 
-class EmailExistsCheck(APIView):
-    throttle_classes = ()
-    permission_classes = ()
 
-    def post(self, request, *args, **kwargs):
-        content = {}
-        try:
-            email = request.data.get('email')
-            User.objects.get(email=email)
-            content = {'email': email}
-        except User.DoesNotExist:
-            pass
-        return Response(content)
-
-
-class UserExistsCheck(APIView):
-    throttle_classes = ()
+def existence_cache_key(field, value):
+    return 'gameon:exists:{}:{}'.format(field, value)
+
+
+def invalidate_existence(user):
+    existence_cache.delete(existence_cache_key('email', user.email.lower()))
+    existence_cache.delete(existence_cache_key('username', user.username))
+
+
+class ExistsCheck(APIView):
+    """
+    Base view for checking whether a User already exists with the value
+    provided for 'field', for validating the signup form.
+
+    Each check is a single indexed exists() query (see migration 0008 for
+    the email index), and the results are cached briefly. Requests are
+    throttled under the 'signup_checks' scope.
+    """
+    throttle_classes = (ScopedRateThrottle,)
+    throttle_scope = 'signup_checks'
     permission_classes = ()
+    field = None
+
+    def normalize(self, value):
+        return value
+
+    def get_lookup(self, value):
+        return {self.field: value}
 
     def post(self, request, *args, **kwargs):
-        content = {}
-        try:
-            username = request.data.get('username')
-            User.objects.get(username=username)
-            content = {'user': username}
-        except User.DoesNotExist:
-            pass
-        return Response(content)
+        value = request.data.get(self.field)
+        if not value or not isinstance(value, str):
+            return Response({})
+
+        key = existence_cache_key(self.field, self.normalize(value))
+        exists = existence_cache.get(key)
+        if exists is None:
+            exists = User.objects.filter(**self.get_lookup(value)).exists()
+            existence_cache.set(key, exists)
+        return Response({self.response_key: value} if exists else {})
+
+
+class EmailExistsCheck(ExistsCheck):
+    """
+    Concrete view for checking whether an email address is already in use.
+    Email addresses are matched case-insensitively.
+    """
+    field = 'email'
+    response_key = 'email'
+
+    def normalize(self, value):
+        return value.lower()
+
+    def get_lookup(self, value):
+        return {'email__iexact': value}
+
+
+class UserExistsCheck(ExistsCheck):
+    """
+    Concrete view for checking whether a username is already in use.
+    """
+    field = 'username'
+    response_key = 'user'
+
+
+def get_profile(user):
+    """
+    Returns the user's Profile with a single select on the (unique) owner.
+    Users created outside of the signup flow (e.g. in the admin) do not
+    have a Profile until they first read it, so it is created if needed.
+    """
+    try:
+        return UserProfile.objects.get(owner=user)
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(owner=user)
+        return profile
 
 
 class UserProfileDetailsView(generics.RetrieveUpdateAPIView):
     """
     View for accessing a user's Profile.
+
+    Profiles are created at signup (see receivers.py), so reads are a
+    single select on the (unique) owner, and GET responses are served
+    from the per-user response cache.
     """
     serializer_class = UserProfileSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    cache_key = 'profile'
+
+    def get_queryset(self):
+        return UserProfile.objects.filter(owner=self.request.user)
 
     def get_object(self):
-        return self.get_queryset()
+        return get_profile(self.request.user)
 
-    def get_queryset(self):
-        user, created = UserProfile.objects.get_or_create(
-            owner=self.request.user)
-        return user
+    def retrieve(self, request, *args, **kwargs):
+        return Response(response_cache.get_or_set(
+            request.user, self.cache_key,
+            lambda: super(UserProfileDetailsView, self)
+            .retrieve(request, *args, **kwargs).data))
+
+    def perform_update(self, serializer):
+        serializer.save()
+        send_data_changed(self.__class__, self.request.user, 'profile')
 
 
 class UserDetailsView(generics.RetrieveUpdateAPIView):
@@ -0,0 +1,114 @@
+"""
+Views for the 'bootstrap' API endpoint.
+"""
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .caching import response_cache
+from .fast_serializers import GAME_FIELDS, PLATFORM_FIELDS, TAG_FIELDS,\
+    fast_reads_enabled, serialize_games, serialize_platforms, serialize_tags
+from .models import PlatformModel, Tag
+from .pagination import OptionalCursorPagination
+from .profiling import serializing
+from .serializers import GameReadSerializer, PlatformSerializer,\
+    TagSerializer, UserDetailsSerializer, UserProfileSerializer
+from .views_auth import get_profile
+from .views_games import GameList, game_queryset
+
+
+class BootstrapView(APIView):
+    """
+    Concrete view for retrieving everything the client needs on startup,
+    in place of separate requests to each of the following:
+    - rest-auth/user/
+    - rest-auth/user/profile/
+    - api/v1/platforms/ (all of them, ordered by 'created')
+    - api/v1/tags/ (all of them, ordered by 'created')
+    - api/v1/games/ (the first page, as with '?paginate=cursor')
+
+    URL looks like:
+    api/v1/bootstrap
+
+    Response looks like:
+    {
+        user: [User],
+        profile: [Profile],
+        platforms: [list of Platforms],
+        tags: [list of Tags],
+        games: { next: [url|null], previous: null, results: [list of Games] }
+    }
+    The 'next' link for the Games points at api/v1/games/, so the client
+    can carry on paging from there.
+
+    The payloads match the individual endpoints, and are built with six
+    queries (one each for the Profile, Platforms, Tags and Games, plus one
+    each for the Games' dates and Tags). Everything but the User is cached
+    in the per-user response cache, under the scheme and host as well
+    (which appear in the 'next' link); the User is already loaded by the
+    authentication, so it costs no queries either way.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    cache_key = 'bootstrap'
+    cursor_ordering = GameList.default_cursor_ordering
+
+    def get_platforms(self, request):
+        platforms = PlatformModel.objects\
+            .filter(owner=request.user)\
+            .order_by('created', 'id')
+        if fast_reads_enabled():
+            rows = list(platforms.values(*PLATFORM_FIELDS))
+            with serializing():
+                return serialize_platforms(rows)
+        platforms = list(platforms)
+        with serializing():
+            return PlatformSerializer(platforms, many=True).data
+
+    def get_tags(self, request):
+        tags = Tag.objects\
+            .filter(owner=request.user)\
+            .order_by('created', 'id')
+        if fast_reads_enabled():
+            rows = list(tags.values(*TAG_FIELDS))
+            with serializing():
+                return serialize_tags(rows)
+        tags = list(tags)
+        with serializing():
+            return TagSerializer(tags, many=True).data
+
+    def get_games(self, request):
+        queryset = game_queryset(request)
+        if fast_reads_enabled():
+            queryset = queryset.prefetch_related(None).values(*GAME_FIELDS)
+        paginator = OptionalCursorPagination().get_cursor_paginator(self)
+        page = paginator.paginate_queryset(queryset, request, self)
+        with serializing():
+            if fast_reads_enabled():
+                results = serialize_games(page)
+            else:
+                results = GameReadSerializer(page, many=True).data
+        # the links are built from base_url, which would otherwise be the
+        # URL of this view; the games endpoint is mounted alongside it
+        paginator.base_url = request.build_absolute_uri(
+            request.path[:request.path.rindex('bootstrap')] + 'games/')
+        return paginator.get_paginated_response(results).data
+
+    def get_data(self, request):
+        profile = get_profile(request.user)
+        with serializing():
+            profile = UserProfileSerializer(profile).data
+        return {
+            'profile': profile,
+            'platforms': self.get_platforms(request),
+            'tags': self.get_tags(request),
+            'games': self.get_games(request),
+        }
+
+    def get(self, request, *args, **kwargs):
+        key = '{}|{}://{}'.format(
+            self.cache_key, request.scheme, request.get_host())
+        data = response_cache.get_or_set(
+            request.user, key, lambda: self.get_data(request))
+        response = {'user': UserDetailsSerializer(request.user).data}
+        response.update(data)
+        return Response(response)
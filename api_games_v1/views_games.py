@@ -1,61 +1,257 @@
 """
 Views for the 'games' API endpoints.
 """
-from rest_framework import generics, permissions
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Q
+from rest_framework import generics, permissions, serializers, status
+from rest_framework.response import Response
 
-from .models import Game, GameDateRelation, PlatformModel
-from .serializers import GameReadSerializer, GameWriteSerializer
+from .caching import response_cache
+from .conditional import ConditionalGetMixin, latest
+from .fast_serializers import GAME_FIELDS, FastReadMixin, serialize_games
+from .models import Game, GameDateRelation, PlatformModel, TagGameRelation
+from .serializers import GameBulkItemSerializer, GameReadSerializer,\
+    GameWriteSerializer
+from .signals import send_data_changed
+from .sync import record_deletes
+
+
+def game_queryset(request):
+    """
+    Returns the requesting user's Games, with each Game's Platform, dates
+    and Tags loaded in bulk (rather than one query per Game when serializing).
+    """
+    return Game.objects.filter(owner=request.user)\
+        .select_related('platform')\
+        .prefetch_related('dates', Prefetch(
+            'tags',
+            queryset=TagGameRelation.objects
+            .select_related('_tag')
+            .order_by('pk')))
+
+
+def filter_by_tags(request, queryset):
+    """
+    Filters Games by the Tag ids in the 'tags' query param
+    (e.g. '?tags=1,2'). By default, Games with ANY of the Tags are returned;
+    with '?tags_match=all', only Games with ALL of the Tags are returned.
+
+    Each Tag is matched with a join on the unique (owner, _tag, _game)
+    index, so either way this is a single query.
+    """
+    param = request.query_params.get('tags')
+    if not param:
+        return queryset
+    try:
+        tag_ids = sorted({int(tag_id) for tag_id in param.split(',')})
+    except ValueError:
+        raise serializers.ValidationError(
+            {'tags': ['Expected a comma-separated list of Tag ids.']})
+
+    if request.query_params.get('tags_match') == 'all':
+        for tag_id in tag_ids:
+            queryset = queryset.filter(
+                tags__owner=request.user, tags___tag=tag_id)
+        return queryset
+    return queryset.filter(
+        tags__owner=request.user, tags___tag__in=tag_ids).distinct()
+
+
+def query_param(request, field, name):
+    """
+    Validates a single query param with the provided serializer field.
+    Returns None if the param was not provided.
+    """
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return field.run_validation(value)
+    except serializers.ValidationError as e:
+        raise serializers.ValidationError({name: e.detail})
+
+
+def filter_games(request, queryset):
+    """
+    Filters Games by the query params in the request:
+    - 'platform': a Platform id, or 'none' for Games without a Platform
+    - 'finished': 'true' or 'false'
+    - 'played_after'/'played_before': Games with a date in the range
+        (inclusive), which is matched on the (owner, date, game) index
+    - 'title': case-insensitive title prefix
+    - 'search': case-insensitive title substring
+    - 'tags'/'tags_match': see filter_by_tags()
+
+    Each filter is backed by an owner-scoped index; see migration 0007 for
+    the (database-specific) index behind the title lookups.
+    """
+    platform = request.query_params.get('platform')
+    if platform == 'none':
+        queryset = queryset.filter(platform__isnull=True)
+    elif platform:
+        queryset = queryset.filter(
+            platform=query_param(request, serializers.IntegerField(),
+                                 'platform'))
+
+    finished = query_param(request, serializers.BooleanField(), 'finished')
+    if finished is not None:
+        queryset = queryset.filter(finished=finished)
+
+    played_after = query_param(
+        request, serializers.DateField(), 'played_after')
+    played_before = query_param(
+        request, serializers.DateField(), 'played_before')
+    if played_after or played_before:
+        # both bounds go in a single filter(), so they apply to the same date
+        date_filter = {'dates__owner': request.user}
+        if played_after:
+            date_filter['dates__date__gte'] = played_after
+        if played_before:
+            date_filter['dates__date__lte'] = played_before
+        queryset = queryset.filter(**date_filter).distinct()
+
+    title = query_param(request, serializers.CharField(), 'title')
+    if title:
+        queryset = queryset.filter(title__istartswith=title)
+    search = query_param(request, serializers.CharField(), 'search')
+    if search:
+        queryset = queryset.filter(title__icontains=search)
+
+    return filter_by_tags(request, queryset)
 
 
 def parse_platform(request):
     """
-    Returns a PlatformModel instance based on the ID specified in the request.
+    Returns a PlatformModel instance based on the ID specified in the request,
+    or None if no Platform was specified.
     """
+    if not request.data.get('platform'):
+        return None
     return PlatformModel.objects.get(
         owner=request.user,
         id=request.data.get('platform'))
 
 
-def process_dates(request, game, dates):
+def parse_dates(dates, key):
     """
-    Processes the list of new dates to add to a Game instance.
-    Simply run a get_or_create() call with each provided date,
-        just to make sure that that date exists.
+    Converts a list of date strings from the request into a set of dates.
+    Raises a ValidationError (under the specified key) if it is not a list,
+    or for any bad values (including nulls and non-strings).
     """
-    if dates:
-        for date in dates:
-            GameDateRelation.objects.get_or_create(
-                owner=request.user,
-                date=date,
-                game=game,
-            )
+    if dates is None:
+        return set()
+    if not isinstance(dates, list):
+        raise serializers.ValidationError(
+            {key: ['Expected a list of dates.']})
+    field = serializers.DateField()
+    try:
+        return {field.run_validation(date) for date in dates}
+    except serializers.ValidationError as e:
+        raise serializers.ValidationError({key: e.detail})
 
 
-def process_removed_dates(request, game, dates):
+def apply_date_changes(owner, changes):
     """
-    Processes the list of new dates to add to a Game instance.
-    Simply run a get() call with each provided date,
-        and delete any that are found.
+    Applies date changes to any number of Games, using a fixed number of
+    queries regardless of how many Games or dates there are:
+    - one query for the dates that already exist
+    - one bulk insert for any that do not
+    - one query for the removed dates, and one delete for all of them
+        (recording their Tombstones with one more)
+    Removed dates that do not exist are simply ignored.
+
+    'changes' is a list of (game, added dates, removed dates) tuples,
+    where the dates are sets of date objects.
     """
-    if dates:
-        for date in dates:
-            gdr = GameDateRelation.objects.get(
-                owner=request.user,
-                date=date,
-                game=game,
-            )
-            if gdr:
-                gdr.delete()
+    # if a date was both added and removed, removal wins
+    changes = [(game, added - removed, removed)
+               for game, added, removed in changes]
 
+    with transaction.atomic():
+        added_games = [game for game, added, _ in changes if added]
+        if added_games:
+            existing = set(GameDateRelation.objects.filter(
+                owner=owner,
+                game__in=added_games,
+            ).values_list('game_id', 'date'))
+            GameDateRelation.objects.bulk_create([
+                GameDateRelation(owner=owner, game=game, date=date)
+                for game, added, _ in changes
+                for date in sorted(added)
+                if (game.pk, date) not in existing
+            ])
 
-class GameList(generics.ListCreateAPIView):
+        removed_filter = Q()
+        for game, _, removed in changes:
+            if removed:
+                removed_filter |= Q(game=game, date__in=removed)
+        if removed_filter:
+            removed_ids = list(GameDateRelation.objects
+                               .filter(removed_filter, owner=owner)
+                               .values_list('pk', flat=True))
+            if removed_ids:
+                GameDateRelation.objects\
+                    .filter(pk__in=removed_ids)\
+                    .delete()
+                record_deletes(owner, 'dates', removed_ids)
+
+
+def sync_dates(request, game, dates=None, removed_dates=None):
+    """
+    Syncs a Game's dates with the lists of added and removed dates
+    from the request (see apply_date_changes()).
+    """
+    apply_date_changes(request.user, [(
+        game,
+        parse_dates(dates, 'dates'),
+        parse_dates(removed_dates, 'datesRemoved'),
+    )])
+
+
+class GameList(ConditionalGetMixin, FastReadMixin,
+               generics.ListCreateAPIView):
     """
     Concrete view for listing a queryset or creating a model instance.
     """
     permission_classes = (permissions.IsAuthenticated,)
+    fast_fields = GAME_FIELDS
+    sort_fields = ('title', 'created', 'modified')
+    default_cursor_ordering = ('-modified', '-id')
+
+    @property
+    def cursor_ordering(self):
+        return self.get_ordering() or self.default_cursor_ordering
+
+    def get_ordering(self):
+        """
+        Returns the ordering from the 'sort' query param (e.g. '?sort=title'
+        or '?sort=-created'), with 'id' as a tie-breaker, or None if the
+        request did not specify one.
+        """
+        sort = self.request.query_params.get('sort')
+        if not sort:
+            return None
+        if sort.lstrip('-') not in self.sort_fields:
+            raise serializers.ValidationError({'sort': [
+                'Expected one of: {}.'.format(', '.join(self.sort_fields))]})
+        return sort, '-id' if sort.startswith('-') else 'id'
 
     def get_queryset(self):
-        return Game.objects.filter(owner=self.request.user)
+        queryset = filter_games(self.request, game_queryset(self.request))
+        ordering = self.get_ordering()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_validators(self):
+        # Games embed their Platform's title and their Tags, so those count
+        # too. Date changes always save the Game, so they bump its 'modified'.
+        validators = []
+        for model in (Game, PlatformModel, TagGameRelation):
+            aggregate = model.objects.filter(owner=self.request.user)\
+                .aggregate(count=Count('pk'), modified=Max('modified'))
+            validators += [aggregate['count'], aggregate['modified']]
+        return validators, None
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -63,23 +259,69 @@ class GameList(generics.ListCreateAPIView):
         if self.request.method == 'POST':
             return GameWriteSerializer
 
+    def serialize_rows(self, rows):
+        return serialize_games(rows)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Override of default list() method to serve pages from the
+        response cache when possible.
+
+        Pages are cached under their ETag (plus the host, which appears in
+        the pagination links), so a cached page is only ever served for
+        the data it was built from. The validators are read before the
+        page is, so a page is never older than the ETag it is cached under.
+        """
+        if self.etag is None:
+            return super(GameList, self).list(request, *args, **kwargs)
+        data = response_cache.get_or_set_content(
+            '{}|{}'.format(self.etag, request.get_host()),
+            lambda: super(GameList, self).list(
+                request, *args, **kwargs).data)
+        return Response(data)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         game_instance = serializer.save(
             owner=self.request.user,
             platform=parse_platform(self.request))
         # create any new dates in the request
-        process_dates(self.request, game_instance,
-                      self.request.data.get('dates'))
+        sync_dates(self.request, game_instance,
+                   self.request.data.get('dates'))
+        send_data_changed(
+            self.__class__, self.request.user, 'games', 'dates')
 
 
-class GameDetail(generics.RetrieveUpdateDestroyAPIView):
+class GameDetail(ConditionalGetMixin, FastReadMixin,
+                 generics.RetrieveUpdateDestroyAPIView):
     """
     Concrete view for retrieving, updating or deleting a model instance.
     """
     permission_classes = (permissions.IsAuthenticated,)
+    fast_fields = GAME_FIELDS
 
     def get_queryset(self):
-        return Game.objects.filter(owner=self.request.user)
+        if self.request.method == 'GET':
+            return game_queryset(self.request)
+        # writes re-read the dates after syncing them, so skip the prefetch
+        return Game.objects.filter(owner=self.request.user)\
+            .select_related('platform')
+
+    def get_validators(self):
+        row = Game.objects\
+            .filter(owner=self.request.user, pk=self.kwargs['pk'])\
+            .annotate(tag_count=Count('tags'),
+                      tags_modified=Max('tags__modified'))\
+            .values_list('modified', 'platform__modified',
+                         'tag_count', 'tags_modified')\
+            .first()
+        if row is None:
+            return None, None
+        modified, platform_modified, tag_count, tags_modified = row
+        return row, latest(modified, platform_modified, tags_modified)
+
+    def serialize_rows(self, rows):
+        return serialize_games(rows)
 
     def get_serializer_class(self):
         if self.request.method in ('GET', 'DELETE'):
@@ -87,6 +329,7 @@ class GameDetail(generics.RetrieveUpdateDestroyAPIView):
         if self.request.method in ('PUT', 'PATCH'):
             return GameWriteSerializer
 
+    @transaction.atomic
     def perform_update(self, serializer):
         # add platform info IF an ID is provided; if not, just leave it blank
         # this is to support both PUT and PATCH methods,
@@ -97,9 +340,135 @@ class GameDetail(generics.RetrieveUpdateDestroyAPIView):
         else:
             game_instance = serializer.save()
 
-        # create any new dates in the request
-        process_dates(self.request, game_instance,
-                      self.request.data.get('dates'))
-        # delete any dates that have been removed
-        process_removed_dates(self.request, game_instance,
-                              self.request.data.get('datesRemoved'))
+        # create any new dates in the request,
+        # and delete any dates that have been removed
+        sync_dates(self.request, game_instance,
+                   self.request.data.get('dates'),
+                   self.request.data.get('datesRemoved'))
+        send_data_changed(
+            self.__class__, self.request.user, 'games', 'dates')
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        record_deletes(self.request.user, 'games', [instance.pk])
+        instance.delete()
+        send_data_changed(
+            self.__class__, self.request.user, 'games', 'dates', 'tags')
+
+
+class GameBulkView(generics.GenericAPIView):
+    """
+    Concrete view for creating and/or updating many Games in one request.
+
+    URL looks like:
+    api/v1/games/bulk/
+
+    POST request should be a list of Games, each of which looks like:
+    {
+        id: [number] (optional, pk of an existing Game to update)
+        title: [string, max=255] (required when creating a Game)
+        platform: [number|null] (optional, pk of an existing Platform)
+        finished: [boolean] (optional)
+        dates: [list of dates] (optional, dates to add)
+        datesRemoved: [list of dates] (optional, dates to remove)
+    }
+
+    All of the items are validated before anything is written, and all of
+    the writes happen in a single transaction; if any item is invalid,
+    nothing is written. The response contains one result per item,
+    in the same order as the request:
+    { status: 'created'|'updated', game: [Game] }
+    or, if the request was rejected:
+    { status: 'invalid'|'ok', errors: [object] }
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = GameBulkItemSerializer
+    max_items = 500
+
+    def get_queryset(self):
+        return Game.objects.filter(owner=self.request.user)
+
+    def validate_items(self, items):
+        """
+        Validates each item, and resolves all of the Platforms and existing
+        Games they refer to (in one query each). Returns the validated items
+        and a list of errors (or None) for each item.
+        """
+        validated, errors = [], []
+        for item in items:
+            serializer = self.get_serializer(data=item)
+            serializer.is_valid()
+            validated.append(serializer.validated_data)
+            errors.append(serializer.errors or None)
+
+        platforms = PlatformModel.objects\
+            .filter(owner=self.request.user)\
+            .in_bulk([data['platform'] for data in validated
+                      if data.get('platform')])
+        games = self.get_queryset().in_bulk(
+            [data['id'] for data in validated if 'id' in data])
+
+        for index, data in enumerate(validated):
+            if errors[index]:
+                continue
+            if data.get('platform') and data['platform'] not in platforms:
+                errors[index] = {'platform': ['Platform not found.']}
+            elif 'id' in data and data['id'] not in games:
+                errors[index] = {'id': ['Game not found.']}
+            else:
+                if 'platform' in data:
+                    data['platform'] = platforms.get(data['platform'])
+                if 'id' in data:
+                    data['game'] = games[data['id']]
+        return validated, errors
+
+    @transaction.atomic
+    def save_items(self, validated):
+        """
+        Creates/updates each Game, then applies all of their date changes
+        at once. Returns the list of saved Games.
+
+        Since Game inherits from the concrete BaseModel, the Games themselves
+        cannot be bulk inserted, but they are all saved in one transaction.
+        """
+        saved, changes = [], []
+        for data in validated:
+            game = data.get('game') or Game(owner=self.request.user)
+            for attr in ('title', 'platform', 'finished'):
+                if attr in data:
+                    setattr(game, attr, data[attr])
+            game.save()
+            saved.append(game)
+            changes.append((game,
+                            set(data.get('dates', ())),
+                            set(data.get('datesRemoved', ()))))
+        apply_date_changes(self.request.user, changes)
+        send_data_changed(
+            self.__class__, self.request.user, 'games', 'dates')
+        return saved
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Expected a list of Games.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {'detail': 'No more than {} Games may be sent at once.'
+                    .format(self.max_items)},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        validated, errors = self.validate_items(items)
+        if any(errors):
+            return Response([
+                {'status': 'invalid', 'errors': item_errors}
+                if item_errors else {'status': 'ok'}
+                for item_errors in errors
+            ], status=status.HTTP_400_BAD_REQUEST)
+
+        saved = self.save_items(validated)
+        games = game_queryset(request).in_bulk([game.pk for game in saved])
+        return Response([{
+            'status': 'updated' if 'id' in data else 'created',
+            'game': GameReadSerializer(games[game.pk]).data,
+        } for data, game in zip(validated, saved)])
@@ -0,0 +1,68 @@
+"""
+Views for exporting/importing a user's entire library.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework import permissions, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .library import EXPORT_FORMATS, IMPORT_FORMATS, LibraryImporter,\
+    LibraryImportError, export_records
+from .signals import send_data_changed
+
+
+class LibraryExportView(APIView):
+    """
+    Concrete view for exporting all of a user's data as a stream.
+
+    URL looks like:
+    api/v1/library/export/<ndjson|csv>
+
+    The response is streamed as it is read from the database,
+    so it can be used for libraries of any size.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, export_format, *args, **kwargs):
+        encode, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            encode(export_records(request.user)), content_type=content_type)
+        response['Content-Disposition'] = \
+            'attachment; filename="gameon-library.{}"'.format(export_format)
+        return response
+
+
+class LibraryImportView(APIView):
+    """
+    Concrete view for importing records (e.g. from an export)
+    into a user's library.
+
+    URL looks like:
+    api/v1/library/import/<ndjson|csv>
+
+    POST request should be a multipart upload, with the records in a 'file'
+    field. The upload is parsed and loaded incrementally, in chunks (see
+    LibraryImporter). The response contains the number of records loaded
+    and the rate they were loaded at; if a record cannot be loaded,
+    the response is a 400 with the error and the records loaded so far.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, import_format, *args, **kwargs):
+        upload = request.data.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        importer = LibraryImporter(request.user)
+        try:
+            stats = importer.run(IMPORT_FORMATS[import_format](upload))
+        except LibraryImportError as e:
+            return Response({'detail': str(e), 'stats': importer.stats()},
+                            status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            send_data_changed(self.__class__, request.user,
+                              'games', 'dates', 'platforms', 'tags')
+        return Response(stats)
@@ -0,0 +1,26 @@
+"""
+Views for the 'metrics' API endpoint.
+"""
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from .profiling import registry
+
+
+class MetricsView(APIView):
+    """
+    Concrete view for the request metrics recorded by ProfilingMiddleware,
+    in the Prometheus text format. Only available to staff users.
+
+    URL looks like:
+    api/v1/metrics
+
+    Note that the metrics are per-process, so each process has to be
+    scraped separately.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            registry.render(), content_type='text/plain; version=0.0.4')
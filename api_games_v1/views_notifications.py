@@ -0,0 +1,75 @@
+"""
+Views for the 'changes' API endpoint.
+"""
+from django.conf import settings
+from django.db import connection
+from rest_framework import permissions, serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .notifications import broker, waiters
+from .views_games import query_param
+
+
+def notifications_setting(name, default):
+    return getattr(settings, 'GAMEON_NOTIFICATIONS', {}).get(name, default)
+
+
+class ChangesView(APIView):
+    """
+    Concrete view for waiting (long-polling) for a user's data to change,
+    in place of polling the list endpoints.
+
+    URL looks like:
+    api/v1/changes?after=<sequence>&timeout=<seconds>
+
+    Without 'after', the current sequence number is returned immediately.
+    Otherwise, the request is held until the user's data changes, or until
+    the timeout (capped at settings.GAMEON_NOTIFICATIONS['MAX_WAIT'])
+    runs out. Response looks like:
+    {
+        sequence: [number] (to send as 'after' next time)
+        kinds: [list of strings|null] (the kinds of data that changed,
+            e.g. 'games' or 'tags'; empty if nothing has, or null if
+            the client should assume that everything has)
+    }
+    The client can then fetch just what has changed (e.g. with api/v1/sync),
+    and wait again.
+
+    Each waiting request holds a worker thread, so only MAX_WAITERS
+    requests may wait at once in each process; beyond that, requests are
+    answered immediately (without waiting), with a Retry-After header.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        owner_id = request.user.pk
+        after = query_param(request, serializers.IntegerField(), 'after')
+        if after is None:
+            return Response({
+                'sequence': broker.get_sequence(owner_id),
+                'kinds': [],
+            })
+
+        max_wait = notifications_setting('MAX_WAIT', 25)
+        timeout = query_param(
+            request, serializers.FloatField(min_value=0), 'timeout')
+        timeout = max_wait if timeout is None else min(timeout, max_wait)
+
+        headers = {}
+        if waiters.acquire(notifications_setting('MAX_WAITERS', 8)):
+            try:
+                # don't hold on to a database connection while waiting
+                if not connection.in_atomic_block:
+                    connection.close()
+                sequence, kinds = broker.wait(owner_id, after, timeout)
+            finally:
+                waiters.release()
+        else:
+            sequence, kinds = broker.wait(owner_id, after, 0)
+            headers['Retry-After'] = str(
+                notifications_setting('RETRY_AFTER', 5))
+        return Response({
+            'sequence': sequence,
+            'kinds': None if kinds is None else sorted(kinds),
+        }, headers=headers)
@@ -1,30 +1,78 @@
+from django.db import transaction
+from django.db.models import Count, Max
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 
+from .conditional import ConditionalGetMixin
+from .fast_serializers import PLATFORM_FIELDS, FastReadMixin,\
+    serialize_platforms
 from .models import PlatformModel
 from .serializers import PlatformSerializer
+from .signals import send_data_changed
+from .sync import record_deletes
 
 
-class PlatformList(generics.ListCreateAPIView):
+class PlatformList(ConditionalGetMixin, FastReadMixin,
+                   generics.ListCreateAPIView):
     """
     Concrete view for listing a queryset or creating a model instance.
     """
     permission_classes = (permissions.IsAuthenticated,)
+    cursor_ordering = ('created', 'id')
     serializer_class = PlatformSerializer
+    fast_fields = PLATFORM_FIELDS
 
     def get_queryset(self):
         return PlatformModel.objects.filter(owner=self.request.user)
 
+    def get_validators(self):
+        platforms = self.get_queryset()\
+            .aggregate(count=Count('pk'), modified=Max('modified'))
+        return [platforms['count'], platforms['modified']], None
+
+    def serialize_rows(self, rows):
+        return serialize_platforms(rows)
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+        send_data_changed(self.__class__, self.request.user, 'platforms')
 
 
-class PlatformDetail(generics.RetrieveUpdateDestroyAPIView):
+class PlatformDetail(ConditionalGetMixin, FastReadMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     """
     Concrete view for retrieving, updating or deleting a model instance.
     """
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = PlatformSerializer
+    fast_fields = PLATFORM_FIELDS
 
     def get_queryset(self):
         return PlatformModel.objects.filter(owner=self.request.user)
+
+    def get_validators(self):
+        modified = self.get_queryset()\
+            .filter(pk=self.kwargs['pk'])\
+            .values_list('modified', flat=True)\
+            .first()
+        if modified is None:
+            return None, None
+        return [modified], modified
+
+    def serialize_rows(self, rows):
+        return serialize_platforms(rows)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        # Games embed their Platform's title
+        send_data_changed(
+            self.__class__, self.request.user, 'platforms', 'games')
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        record_deletes(self.request.user, 'platforms', [instance.pk])
+        instance.delete()
+        # deleting a Platform also deletes its Games
+        send_data_changed(
+            self.__class__, self.request.user,
+            'platforms', 'games', 'dates', 'tags')
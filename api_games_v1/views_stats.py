@@ -0,0 +1,24 @@
+"""
+Views for the 'stats' API endpoints.
+"""
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .stats import stats_cache
+
+
+class StatsView(APIView):
+    """
+    Concrete view for retrieving the dashboard stats for a user's library.
+
+    URL looks like:
+    api/v1/stats
+
+    Each set of stats is cached separately, and only recomputed after
+    a write to the data it depends on (see stats.py).
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        return Response(stats_cache.get_stats(request.user))
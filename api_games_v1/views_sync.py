@@ -0,0 +1,44 @@
+"""
+Views for the 'sync' API endpoint.
+"""
+from rest_framework import permissions, serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .sync import changes_since, retention_cutoff
+from .views_games import query_param
+
+
+class SyncView(APIView):
+    """
+    Concrete view for retrieving the changes to a user's library since
+    the last sync.
+
+    URL looks like:
+    api/v1/sync?since=<watermark>
+
+    'since' should be the 'watermark' from the previous sync; without it,
+    every row is returned. Response looks like:
+    {
+        watermark: [datetime] (to send as 'since' next time)
+        platforms: [list of Platforms changed since the watermark]
+        games: [list of Games]
+        dates: [list of dates]
+        tags: [list of Tags]
+        tag_relations: [list of Tag relations]
+        deleted: { games: [list of ids], platforms: [list of ids], ... }
+    }
+
+    Tombstones for deletes are only kept for a limited time (see
+    settings.GAMEON_SYNC), so a watermark older than that gets a
+    410 response, and the client should start over without one.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        since = query_param(request, serializers.DateTimeField(), 'since')
+        if since is not None and since < retention_cutoff():
+            return Response(
+                {'detail': 'Watermark is too old; a full sync is required.'},
+                status=status.HTTP_410_GONE)
+        return Response(changes_since(request.user, since))
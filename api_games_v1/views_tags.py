@@ -1,11 +1,19 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.serializers import CharField, IntegerField
 
-from .models import Tag, TagGameRelation
-from .serializers import TagSerializer, TagGameRelationWriteSerializer
+from .fast_serializers import TAG_FIELDS, FastReadMixin, serialize_tags
+from .models import Game, Tag, TagGameRelation
+from .serializers import TagGameRelationBulkSerializer, TagSerializer,\
+    TagGameRelationWriteSerializer
+from .signals import send_data_changed
+from .sync import record_deletes
 
 
-class TagList(generics.ListCreateAPIView):
+class TagList(FastReadMixin, generics.ListCreateAPIView):
     """
     Concrete view for listing a queryset or creating a model instance.
 
@@ -21,13 +29,19 @@ class TagList(generics.ListCreateAPIView):
     }
     """
     permission_classes = (permissions.IsAuthenticated,)
+    cursor_ordering = ('created', 'id')
     serializer_class = TagSerializer
+    fast_fields = TAG_FIELDS + ('created',)
 
     def get_queryset(self):
         return Tag.objects.filter(owner=self.request.user)
 
+    def serialize_rows(self, rows):
+        return serialize_tags(rows)
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+        send_data_changed(self.__class__, self.request.user, 'tags')
 
 
 class TagDeleteView(generics.DestroyAPIView):
@@ -44,6 +58,12 @@ class TagDeleteView(generics.DestroyAPIView):
     def get_queryset(self):
         return Tag.objects.filter(owner=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        record_deletes(self.request.user, 'tags', [instance.pk])
+        instance.delete()
+        send_data_changed(self.__class__, self.request.user, 'tags')
+
 
 class TagGameRelationCreateView(generics.CreateAPIView):
     """
@@ -57,6 +77,9 @@ class TagGameRelationCreateView(generics.CreateAPIView):
         _game: [number] (required, pk of an existing Game)
         tag_title: [string, max=100] (optional, to create a new Tag)
     }
+
+    This is an upsert: if the Game already has the Tag, the existing
+    TagGameRelation is returned (with a 200) rather than creating another.
     """
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = TagGameRelationWriteSerializer
@@ -64,73 +87,118 @@ class TagGameRelationCreateView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+    def build_response(self, entry_id, tag, status_code):
+        """
+        Manually builds a response and simply sends back the Tag data.
+        """
+        return Response({
+            'id': entry_id,
+            '_tag': {
+                'id': tag.pk,
+                'title': tag.title
+            }
+        }, status=status_code)
+
+    def validate_field(self, field, name):
+        """
+        Validates a single value from the request (ids are validated as
+        plain integers here, and looked up later along with everything else).
+        Returns None if the value was not provided.
+        """
+        value = self.request.data.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return field.run_validation(value)
+        except ValidationError as e:
+            raise ValidationError({name: e.detail})
+
+    def get_game_tags(self, game_id):
+        """
+        Returns a list of (relation id, Tag id, Tag title) for each of the
+        Game's existing Tags, in a single query. If the user does not own
+        the Game, returns None instead.
+        """
+        rows = Game.objects\
+            .filter(owner=self.request.user, pk=game_id)\
+            .values_list('tags__pk', 'tags___tag__pk', 'tags___tag__title')
+        rows = list(rows)
+        if not rows:
+            return None
+        return [row for row in rows if row[0] is not None]
+
+    def get_or_create_tag(self, tag_id, tag_title):
+        """
+        Returns the user's Tag with the specified title (creating it if
+        necessary) or, if no title was provided, with the specified id.
+        """
+        if tag_title:
+            tag = Tag.objects.filter(
+                owner=self.request.user, title=tag_title).first()
+            if tag is None:
+                try:
+                    with transaction.atomic():
+                        tag = Tag.objects.create(
+                            owner=self.request.user, title=tag_title)
+                except IntegrityError:
+                    # created by a concurrent request since we looked
+                    tag = Tag.objects.get(
+                        owner=self.request.user, title=tag_title)
+            return tag
+        return Tag.objects.filter(owner=self.request.user, pk=tag_id).first()
 
     def create(self, request, *args, **kwargs):
         """
         Override of default create() method to
         provide heavily customized behavior
+
+        Queries:
+        - Game already has the Tag: one query
+        - otherwise: one query for the Game's Tags, one for the Tag, then
+            the inserts for the new TagGameRelation (and new Tag, if needed)
         """
-        # build custom dataset for the serializer based on the type of request
-        request_tag_id = request.data.get('_tag')
-        request_game_id = request.data.get('_game')
+        game_id = self.validate_field(IntegerField(), '_game')
+        tag_id = self.validate_field(IntegerField(), '_tag')
+        tag_title = self.validate_field(
+            CharField(max_length=100), 'tag_title')
+        if game_id is None:
+            raise ValidationError({'_game': ['This field is required.']})
+        if tag_id is None and not tag_title:
+            raise ValidationError(
+                {'_tag': ['Either _tag or tag_title is required.']})
 
         ########################################################
         # Look for an existing identical entry before creating
         ########################################################
-        try:
-            # look for an existing TagGameRelation with these values
-            existing_entry = TagGameRelation.objects.filter(
-                owner__pk=self.request.user.pk,
-                _tag=request_tag_id,
-                _game=request_game_id
-            ).get()
-            # if found, get the associate Tag object
-            existing_entry_tag = Tag.objects.filter(
-                owner__pk=self.request.user.pk,
-                pk=request_tag_id).get()
-            # manually build a response and simply send back the found data
-            return Response({
-                'id': existing_entry.pk,
-                '_tag': {
-                    'id': existing_entry_tag.pk,
-                    'title': existing_entry_tag.title
-                }
-            }, status=status.HTTP_200_OK)
+        game_tags = self.get_game_tags(game_id)
+        if game_tags is None:
+            raise ValidationError({'_game': ['Game not found.']})
+        for entry_id, existing_tag_id, existing_title in game_tags:
+            if (existing_title == tag_title if tag_title
+                    else existing_tag_id == tag_id):
+                return self.build_response(
+                    entry_id, Tag(pk=existing_tag_id, title=existing_title),
+                    status.HTTP_200_OK)
+
         ########################################################
         # Create a new entry if none was found
         ########################################################
-        except TagGameRelation.DoesNotExist:
-            # if a 'tag_title' was provided in the request, we will use that
-            # for the lookup, and create a new Tag if necessary
-            if request.data.get('tag_title'):
-                tag, created = Tag.objects.get_or_create(
-                    owner=request.user,
-                    title=request.data.get('tag_title'))
-                request_tag_id = tag.pk
-            new_entry_data = {
-                '_tag': request_tag_id,
-                '_game': request_game_id,
-            }
-            # now use these settings to create a new TagGameRelation
-            serializer = self.get_serializer(data=new_entry_data)
-            serializer.is_valid(raise_exception=True)
-            self.perform_create(serializer)
-            headers = self.get_success_headers(serializer.data)
-
-            # manually build a response and simply send back the Tag data
-            tag_obj = Tag.objects.get(pk=serializer.data.get('_tag'))
-            res_data = {
-                'id': serializer.data.get('id'),
-                '_tag': {
-                    'id': tag_obj.pk,
-                    'title': tag_obj.title
-                }
-            }
-            return Response(res_data,
-                            status=status.HTTP_201_CREATED,
-                            headers=headers)
+        tag = self.get_or_create_tag(tag_id, tag_title)
+        if tag is None:
+            raise ValidationError({'_tag': ['Tag not found.']})
+        try:
+            with transaction.atomic():
+                entry = TagGameRelation.objects.create(
+                    owner=request.user, _tag=tag, _game_id=game_id)
+        except IntegrityError:
+            # an identical entry was created since we looked for it above
+            # (e.g. by a concurrent request), so just send that one back
+            entry = TagGameRelation.objects.get(
+                owner=request.user, _tag=tag, _game_id=game_id)
+            return self.build_response(entry.pk, tag, status.HTTP_200_OK)
+
+        send_data_changed(self.__class__, request.user, 'tags')
+        return self.build_response(entry.pk, tag, status.HTTP_201_CREATED)
 
 
 class TagGameRelationDeleteView(generics.GenericAPIView):
@@ -152,7 +220,129 @@ class TagGameRelationDeleteView(generics.GenericAPIView):
                 owner__pk=request.user.pk,
                 _tag__pk=tag_id,
                 _game__pk=game_id).get()
-            instance.delete()
+            with transaction.atomic():
+                record_deletes(request.user, 'tag_relations', [instance.pk])
+                instance.delete()
+            send_data_changed(self.__class__, request.user, 'tags')
         except TagGameRelation.DoesNotExist:
             pass
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TagGameRelationBulkView(generics.GenericAPIView):
+    """
+    Concrete view for adding or removing a set of Tags across a set of Games
+    (i.e. every Tag is added to/removed from every Game).
+
+    URL looks like:
+    api/v1/tag-relations/bulk/
+
+    POST request should look like the following.
+    It must contain at least one of the two optional fields:
+    {
+        action: ['add'|'remove']
+        games: [list of numbers] (pks of existing Games)
+        tags: [list of numbers] (optional, pks of existing Tags)
+        tag_titles: [list of strings] (optional, titles of Tags; when
+            adding, any that do not exist yet are created)
+    }
+
+    The existing TagGameRelations are found with one query, and only the
+    differences are written, all in one transaction. The response contains
+    the relations that were added and removed.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = TagGameRelationBulkSerializer
+
+    def get_queryset(self):
+        return TagGameRelation.objects\
+            .filter(owner__pk=self.request.user.pk)
+
+    def get_games(self, game_ids):
+        found = set(Game.objects
+                    .filter(owner=self.request.user, pk__in=game_ids)
+                    .values_list('pk', flat=True))
+        missing = set(game_ids) - found
+        if missing:
+            raise ValidationError({'games': [
+                'Game(s) not found: {}'.format(sorted(missing))]})
+        return found
+
+    def get_tags(self, tag_ids, tag_titles, create):
+        """
+        Returns the user's Tags matching the ids/titles (in one query),
+        creating any missing titles if 'create' is True.
+        """
+        tags = list(Tag.objects.filter(
+            Q(pk__in=tag_ids) | Q(title__in=tag_titles),
+            owner=self.request.user))
+        missing = set(tag_ids) - {tag.pk for tag in tags}
+        if missing:
+            raise ValidationError({'tags': [
+                'Tag(s) not found: {}'.format(sorted(missing))]})
+        if create:
+            titles = {tag.title for tag in tags}
+            for title in sorted(set(tag_titles) - titles):
+                tags.append(Tag.objects.create(
+                    owner=self.request.user, title=title))
+        return tags
+
+    @staticmethod
+    def relation_data(game_id, tag, relation_id=None):
+        return {
+            'id': relation_id,
+            '_game': game_id,
+            '_tag': {
+                'id': tag.pk,
+                'title': tag.title
+            }
+        }
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        adding = data['action'] == 'add'
+
+        try:
+            with transaction.atomic():
+                game_ids = self.get_games(data['games'])
+                tags = {tag.pk: tag for tag in self.get_tags(
+                    data.get('tags', []), data.get('tag_titles', []),
+                    create=adding)}
+                rows = self.get_queryset()\
+                    .filter(_game__in=game_ids, _tag__in=tags)\
+                    .values_list('pk', '_game', '_tag')
+                existing = {(game_id, tag_id): relation_id
+                            for relation_id, game_id, tag_id in rows}
+
+                added, removed = [], []
+                if adding:
+                    for game_id in sorted(game_ids):
+                        for tag_id in sorted(tags):
+                            if (game_id, tag_id) in existing:
+                                continue
+                            relation = TagGameRelation.objects.create(
+                                owner=request.user,
+                                _game_id=game_id,
+                                _tag=tags[tag_id])
+                            added.append(self.relation_data(
+                                game_id, tags[tag_id], relation.pk))
+                elif existing:
+                    self.get_queryset()\
+                        .filter(pk__in=existing.values())\
+                        .delete()
+                    record_deletes(
+                        request.user, 'tag_relations', existing.values())
+                    removed = [
+                        self.relation_data(game_id, tags[tag_id], pk)
+                        for (game_id, tag_id), pk in sorted(existing.items())]
+        except IntegrityError:
+            # a concurrent request changed the same Tags/relations
+            raise ValidationError({'detail': [
+                'These Tags were changed by another request; '
+                'please try again.']})
+
+        if added or removed:
+            send_data_changed(self.__class__, request.user, 'tags')
+        return Response({'added': added, 'removed': removed})
@@ -27,15 +27,19 @@ INSTALLED_APPS = (
 
 SITE_ID = 1
 
+# The 'Api...' classes are the standard middleware, except that they are
+# skipped for API requests that authenticate with a token
+# (see api_games_v1/middleware.py).
 MIDDLEWARE_CLASSES = (
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'api_games_v1.middleware.ProfilingMiddleware',
+    'api_games_v1.middleware.ApiSessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api_games_v1.middleware.ApiCsrfViewMiddleware',
+    'api_games_v1.middleware.ApiAuthenticationMiddleware',
+    'api_games_v1.middleware.ApiSessionAuthenticationMiddleware',
+    'api_games_v1.middleware.ApiMessageMiddleware',
+    'api_games_v1.middleware.ApiXFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
 )
 
@@ -108,12 +112,96 @@ STATICFILES_STORAGE = 'whitenoise.django.GzipManifestStaticFilesStorage'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api_games_v1.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_PAGINATION_CLASS':
-        'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+        'api_games_v1.pagination.OptionalCursorPagination',
+    'PAGE_SIZE': 20,
+    'DEFAULT_THROTTLE_RATES': {
+        # the signup form's username/email checks
+        'signup_checks': '60/min',
+    },
+}
+
+# Per-user cache for serialized API responses (see api_games_v1/caching.py).
+# LocMemBackend keeps a separate cache in each process, so writes handled by
+# one process are only seen by the others once their entries expire; any
+# deployment running multiple processes should use
+# 'api_games_v1.caching.DjangoCacheBackend' with a shared cache instead.
+GAMEON_RESPONSE_CACHE = {
+    'BACKEND': 'api_games_v1.caching.LocMemBackend',
+    'OPTIONS': {
+        'max_entries': 1000,
+        'ttl': 60,
+    },
+}
+
+# Cache for token authentication (see api_games_v1/authentication.py).
+# As above, LocMemBackend is per-process: a token that is deleted (e.g. on
+# logout), or a User that is deactivated, through one process is still
+# accepted by the others until their entries expire. The ttl is therefore
+# kept to a few seconds, which still saves the lookup for bursts of
+# requests; a deployment with a shared cache (e.g. memcached) in CACHES
+# should use 'api_games_v1.caching.DjangoCacheBackend' with it instead,
+# which is invalidated for every process at once.
+GAMEON_TOKEN_CACHE = {
+    'BACKEND': 'api_games_v1.caching.LocMemBackend',
+    'OPTIONS': {
+        'max_entries': 10000,
+        'ttl': 5,
+    },
+}
+
+# Cache for the signup form's username/email checks
+# (see api_games_v1/views_auth.py).
+GAMEON_EXISTENCE_CACHE = {
+    'BACKEND': 'api_games_v1.caching.LocMemBackend',
+    'OPTIONS': {
+        'max_entries': 10000,
+        'ttl': 30,
+    },
+}
+
+# Request profiling (see api_games_v1/middleware.py); the metrics are
+# served at api/v1/metrics. This is opt-in: with SAMPLE_RATE at 0 the
+# middleware removes itself at startup, so a deployment that wants the
+# metrics should set it to a small fraction of requests (e.g. 0.05).
+GAMEON_PROFILING = {
+    'SAMPLE_RATE': 0,
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
+# Serve GET requests for Games, Platforms and Tags from the fast read path
+# (see api_games_v1/fast_serializers.py), rather than the DRF serializers.
+GAMEON_FAST_READS = True
+
+# Delta sync (see api_games_v1/sync.py). Tombstones for deleted objects are
+# kept for TOMBSTONE_RETENTION_DAYS, and then removed by the daily
+# compact_tombstones command; clients that have not synced in that time
+# must do a full sync. OVERLAP_SECONDS sets each watermark back slightly,
+# to allow for transactions that were in progress during a sync.
+GAMEON_SYNC = {
+    'TOMBSTONE_RETENTION_DAYS': 30,
+    'OVERLAP_SECONDS': 5,
+}
+
+# Change notifications for long-polling clients, served at api/v1/changes
+# (see api_games_v1/notifications.py). Each waiting client holds a worker
+# thread for up to MAX_WAIT seconds, which should stay below the router's
+# request timeout (30s on Heroku). At most MAX_WAITERS clients wait at once
+# in each process, which must stay well below the gunicorn '--threads' in
+# the Procfile; the rest are answered immediately, and told to come back
+# after RETRY_AFTER seconds. As with the caches above, LocalBroker is
+# per-process, so multiple processes need a broker that shares events.
+GAMEON_NOTIFICATIONS = {
+    'BACKEND': 'api_games_v1.notifications.LocalBroker',
+    'OPTIONS': {
+        'history': 50,
+    },
+    'MAX_WAIT': 25,
+    'MAX_WAITERS': 8,
+    'RETRY_AFTER': 5,
 }